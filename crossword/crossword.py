@@ -108,26 +108,41 @@ class Crossword():
         # For any pair of variables v1, v2, their overlap is either:
         #    None, if the two variables do not overlap; or
         #    (i, j), where v1's ith character overlaps v2's jth character
-        self.overlaps = dict()
-        for v1 in self.variables:
-            for v2 in self.variables:
-                if v1 == v2:
-                    continue
-                cells1 = v1.cells
-                cells2 = v2.cells
-                intersection = set(cells1).intersection(cells2)
-                if not intersection:
-                    self.overlaps[v1, v2] = None
-                else:
-                    intersection = intersection.pop()
-                    self.overlaps[v1, v2] = (
-                        cells1.index(intersection),
-                        cells2.index(intersection)
-                    )
+        # Only overlapping pairs are stored; other pairs look up as None.
+        # Each cell lies in at most one across and one down variable, so
+        # mapping cells to variables finds every overlap in O(cells)
+        # rather than intersecting the cells of every pair of variables
+        cells = dict()
+        for var in self.variables:
+            for k, cell in enumerate(var.cells):
+                cells.setdefault(cell, []).append((var, k))
+
+        # Also list each variable's neighbors with the overlap offsets,
+        # as (neighbor, i, j), for loops that need both
+        self.overlaps = Overlaps()
+        self.adjacency = {var: [] for var in self.variables}
+        for crossing in cells.values():
+            if len(crossing) == 2:
+                (v1, k1), (v2, k2) = crossing
+                self.overlaps[v1, v2] = (k1, k2)
+                self.overlaps[v2, v1] = (k2, k1)
+                self.adjacency[v1].append((v2, k1, k2))
+                self.adjacency[v2].append((v1, k2, k1))
+        self.neighbor_sets = {
+            var: frozenset(neighbor for neighbor, _, _ in adjacent)
+            for var, adjacent in self.adjacency.items()
+        }
 
     def neighbors(self, var):
         """Given a variable, return set of overlapping variables."""
-        return set(
-            v for v in self.variables
-            if v != var and self.overlaps[v, var]
-        )
+        return self.neighbor_sets[var]
+
+
+class Overlaps(dict):
+    """
+    Dict of overlaps between pairs of variables that gives None for pairs
+    that do not overlap, without storing them.
+    """
+
+    def __missing__(self, key):
+        return None
@@ -1,12 +1,7 @@
-from multiprocessing.context import assert_spawning
-import sys
-from numpy import count_nonzero
-
-from sklearn import neighbors
+import argparse
 
 from crossword import *
-
-import copy
+from wordbits import WordBits, popcount
 
 class CrosswordCreator():
 
@@ -20,6 +15,27 @@ class CrosswordCreator():
             for var in self.crossword.variables
         }
 
+        # Index of each domain by position and letter, and the domain
+        # object and size each variable's index was built from
+        self.buckets = dict()
+        self.indexed = dict()
+
+        # Maintain arc consistency after each assignment while searching
+        self.inference = True
+        self.reset_search()
+
+    def reset_search(self):
+        """
+        Start a new search from an empty assignment: keep the words it
+        uses in `self.used`, log every pruning on `self.trail` so it can be
+        undone, and count the assignments tried in `self.nodes` and the
+        words pruned in `self.prunings`.
+        """
+        self.used = set()
+        self.trail = []
+        self.nodes = 0
+        self.prunings = 0
+
     def letter_grid(self, assignment):
         """
         Return 2D array representing a given assignment.
@@ -94,8 +110,14 @@ class CrosswordCreator():
         """
         Enforce node and arc consistency, and then solve the CSP.
         """
+        self.reset_search()
         self.enforce_node_consistency()
-        self.ac3()
+        if not self.ac3():
+            return None
+
+        # The first pass is never undone, so its trail can go; its
+        # prunings still count towards `self.prunings`
+        self.trail = []
         return self.backtrack(dict())
 
     def enforce_node_consistency(self):
@@ -105,11 +127,96 @@ class CrosswordCreator():
          constraints; in this case, the length of the word.)
         """
         for var in self.crossword.variables:
-            words = copy.deepcopy(self.domains[var])
-            for word in words:
-                if len(word) != var.length:
-                    self.domains[var].remove(word)
+            self.domains[var] = {
+                word for word in self.domains[var]
+                if len(word) == var.length
+            }
+        self.index_domains()
+
+    def index_domains(self):
+        """
+        Build `self.buckets`, which maps each variable to a list with one
+        dict per position in its word, from each letter to the set of
+        words in the variable's domain with that letter at that position.
+        """
+        self.buckets = dict()
+        self.indexed = dict()
+        for var in self.domains:
+            self.index_domain(var)
 
+    def index_domain(self, var):
+        """
+        Build the buckets of the domain of `var` alone.
+        """
+        words = self.domains[var]
+        buckets = [dict() for _ in range(var.length)]
+        for word in words:
+            while len(buckets) < len(word):
+                buckets.append(dict())
+            for k, letter in enumerate(word):
+                buckets[k].setdefault(letter, set()).add(word)
+        self.buckets[var] = buckets
+        self.indexed[var] = (words, len(words))
+
+    def fresh_buckets(self, var):
+        """
+        Return the buckets of `var`, first rebuilding them if its domain
+        was replaced or resized since they were built, as happens when
+        `self.domains` is written to from outside this class. (An outside
+        change that keeps both the set and its size, such as swapping one
+        word for another in place, needs `index_domains` to be called.)
+        """
+        words = self.domains[var]
+        indexed = self.indexed.get(var)
+        if indexed is None or indexed[0] is not words \
+                or indexed[1] != len(words):
+            self.index_domain(var)
+        return self.buckets[var]
+
+    def remove_words(self, var, words, count=True):
+        """
+        Remove `words` from the domain of `var` and from its buckets,
+        counting them in `self.prunings` if `count`.
+        """
+        buckets = self.fresh_buckets(var)
+        domain = self.domains[var]
+        for word in words:
+            domain.remove(word)
+            for k, letter in enumerate(word):
+                buckets[k][letter].remove(word)
+        self.indexed[var] = (domain, len(domain))
+        self.trail.append((var, words))
+        if count:
+            self.prunings += len(words)
+
+    def restore_words(self, var, words):
+        """
+        Put back words taken out of the domain of `var` by `remove_words`.
+        """
+        buckets = self.fresh_buckets(var)
+        domain = self.domains[var]
+        for word in words:
+            domain.add(word)
+            for k, letter in enumerate(word):
+                buckets[k].setdefault(letter, set()).add(word)
+        self.indexed[var] = (domain, len(domain))
+
+    def keep_only(self, var, word):
+        """
+        Remove every word but `word` from the domain of `var`. This is an
+        assignment rather than an inference, so it is not counted in
+        `self.prunings`.
+        """
+        self.remove_words(var, [w for w in self.domains[var] if w != word],
+                          count=False)
+
+    def undo(self, mark):
+        """
+        Undo the prunings logged on the trail since it had length `mark`.
+        """
+        while len(self.trail) > mark:
+            var, words = self.trail.pop()
+            self.restore_words(var, words)
 
     def revise(self, x, y):
         """
@@ -119,20 +226,21 @@ class CrosswordCreator():
 
         Return True if a revision was made to the domain of `x`; return
         False if no revision was made.
-        """        
-        if x != y and self.crossword.overlaps[x, y] is not None:
-            xwords = copy.deepcopy(self.domains[x])
-            for xword in xwords:
+        """
+        if x == y or self.crossword.overlaps[x, y] is None:
+            return False
+
+        # A word of x is supported exactly when some word of y has its
+        # letter in the overlapping square, so whole buckets of x go at
+        # once instead of comparing every pair of words
+        i, j = self.crossword.overlaps[x, y]
+        ybuckets = self.fresh_buckets(y)[j]
+        revision = False
+        for letter, xwords in list(self.fresh_buckets(x)[i].items()):
+            if xwords and not ybuckets.get(letter):
+                self.remove_words(x, list(xwords))
                 revision = True
-                ywords = copy.deepcopy(self.domains[y])
-                for yword in ywords:
-                    if xword[self.crossword.overlaps[x, y][0]] == yword[self.crossword.overlaps[x, y][1]]:
-                        revision = False
-                        break
-                if revision == True:
-                    self.domains[x].remove(xword)
         return revision
-        
 
     def ac3(self, arcs=None):
         """
@@ -145,16 +253,20 @@ class CrosswordCreator():
         """
         # If arcs is None, function should start with an initial queue of all of the arcs in the problem.
         if arcs is None:
+            # reindex every domain, in case they were set from outside
+            self.index_domains()
             queue = []
             for xvar in self.crossword.variables:
                 for yvar in self.crossword.neighbors(xvar):
                     # create a queue for all variables with their respective neighbors
                     queue.append((xvar, yvar))
+        else:
+            queue = list(arcs)
 
         while len(queue) > 0:
             x, y = queue.pop()
             if self.revise(x, y) == True:
-                if len(self.domains[x]) == 0:
+                if not self.domains[x]:
                     return False
                 for neighbor in self.crossword.neighbors(x):
                     if neighbor != y:
@@ -195,7 +307,24 @@ class CrosswordCreator():
                 if neighbor in assignment:
                     (x, y) = self.crossword.overlaps[var, neighbor]
                     if word[x] != assignment[neighbor][y]:
-                        return True
+                        return False
+        return True
+
+    def consistent_with(self, var, word, assignment):
+        """
+        Return True if assigning `word` to `var` keeps the consistent
+        `assignment` consistent; return False otherwise.
+
+        Only the new word is checked: that it has the right length, is not
+        in `self.used` already, and agrees with the assigned neighbors of
+        `var`. This takes time in the degree of `var`, not the size of the
+        assignment.
+        """
+        if len(word) != var.length or word in self.used:
+            return False
+        for neighbor, x, y in self.crossword.adjacency[var]:
+            if neighbor in assignment and word[x] != assignment[neighbor][y]:
+                return False
         return True
 
 
@@ -207,16 +336,16 @@ class CrosswordCreator():
         that rules out the fewest values among the neighbors of `var`.
         """
         # least-constraining values heuristic
-        constrain = {}        
+        # a word rules out every word of a neighbor outside the bucket
+        # holding its letter at their overlap
+        constrain = {}
         for word in self.domains[var]:
             count = 0
-            for neighbor in self.crossword.neighbors(var):
+            for neighbor, x, y in self.crossword.adjacency[var]:
                 if neighbor in assignment:
                     continue
-                for word_n in self.domains[neighbor]:
-                    (x, y) = self.crossword.overlaps[var, neighbor]
-                    if word[x] != word_n[y]:
-                        count += 1
+                matching = self.fresh_buckets(neighbor)[y].get(word[x], ())
+                count += len(self.domains[neighbor]) - len(matching)
             constrain[word] = count
         constrain = sorted(constrain.items(), key=lambda x:x[1]) # constrain is now a list of words sorted by respective number of constrains
         
@@ -243,7 +372,7 @@ class CrosswordCreator():
         unassigned = {}
         for var in self.crossword.variables:
             if var not in assignment:
-                domain_count = len(self.domains[var])
+                domain_count = self.domain_size(var)
                 tot_neighbor = len(self.crossword.neighbors(var))
                 unassigned[var] = (domain_count, tot_neighbor)
         
@@ -251,16 +380,23 @@ class CrosswordCreator():
         unassigned = sorted(unassigned.items(), key=lambda x:(x[1][0], -x[1][1]))
         return unassigned[0][0] # return the first variable in sorted list
 
+    def domain_size(self, var):
+        """
+        Return the number of words in the domain of `var`.
+        """
+        return len(self.domains[var])
+
 
     def backtrack(self, assignment):
         """
         Using Backtracking Search, take as input a partial assignment for the
         crossword and return a complete assignment if possible to do so.
 
-        `assignment` is a mapping from variables (keys) to words (values).
+        `assignment` is a mapping from variables (keys) to words (values),
+        whose words `self.used` must hold.
 
         If no assignment is possible, return None.
-        """       
+        """
         if self.assignment_complete(assignment):
             return assignment
         else:
@@ -268,30 +404,183 @@ class CrosswordCreator():
             var = self.select_unassigned_variable(assignment)
             # start with word in domain that has least-constraining values heuristic
             for word in self.order_domain_values(var, assignment):
-                assignment_temp = copy.deepcopy(assignment)
-                assignment_temp[var] = word
-                # check if the assignment is consistent with the constrains
-                if self.consistent(assignment_temp):
-                    result = self.backtrack(assignment_temp)
+                self.nodes += 1
+                # check the new word against the constraints, trusting
+                # that the rest of the assignment is consistent already
+                if not self.consistent_with(var, word, assignment):
+                    continue
+                # extend the assignment in place, and undo it if it fails
+                assignment[var] = word
+                self.used.add(word)
+                mark = len(self.trail)
+                if self.infer(var, word, assignment):
+                    result = self.backtrack(assignment)
                     if result is not None:
                         return result
+                # restore the domains pruned below this assignment
+                self.undo(mark)
+                self.used.remove(word)
+                del assignment[var]
             return None
 
+    def infer(self, var, word, assignment):
+        """
+        Maintain arc consistency after assigning `word` to `var`: reduce
+        the domain of `var` to that word, and revise the domains of its
+        unassigned neighbors, and of their neighbors in turn.
 
-def main():
+        Return False if some domain ends up empty, so the assignment
+        cannot be extended to a solution; return True otherwise. Either
+        way, the prunings are on the trail for the caller to undo.
+        """
+        if not self.inference:
+            return True
+        self.keep_only(var, word)
+        arcs = [
+            (neighbor, var) for neighbor in self.crossword.neighbors(var)
+            if neighbor not in assignment
+        ]
+        return self.ac3(arcs)
+
+
+class BitsetCrosswordCreator(CrosswordCreator):
+    """
+    Crossword generator whose domains are bitsets over the numbered
+    vocabulary of a `WordBits`, rather than sets of words.
+
+    Every domain is one int, so filtering a domain by length or by the
+    letter at a position is a single bitwise and, and a domain costs one
+    bit per word of the vocabulary instead of a set entry.
+    """
+
+    def __init__(self, crossword):
+        self.crossword = crossword
+        self.vocabulary = WordBits(crossword.words)
+        self.domains = {
+            var: self.vocabulary.all
+            for var in self.crossword.variables
+        }
+
+        # Maintain arc consistency after each assignment while searching
+        self.inference = True
+        self.reset_search()
+
+    def enforce_node_consistency(self):
+        """
+        Keep only the words of each variable's length, which are one run
+        of bits in the vocabulary.
+        """
+        for var in self.crossword.variables:
+            self.domains[var] &= self.vocabulary.lengths.get(var.length, 0)
+
+    def index_domains(self):
+        """
+        Nothing to build: the vocabulary's (position, letter) bitsets
+        index every domain already.
+        """
+
+    def remove_words(self, var, words, count=True):
+        """
+        Remove `words` from the domain of `var`.
+        """
+        self.prune(var, self.domains[var] & self.vocabulary.bits(words),
+                   count)
 
-    # Check usage
-    if len(sys.argv) not in [3, 4]:
-        sys.exit("Usage: python generate.py structure words [output]")
+    def prune(self, var, bits, count=True):
+        """
+        Remove the words in bitset `bits`, all in the domain of `var`, and
+        log them on the trail, counting them in `self.prunings` if `count`.
+        """
+        if bits:
+            self.domains[var] &= ~bits
+            self.trail.append((var, bits))
+            if count:
+                self.prunings += popcount(bits)
+
+    def restore_words(self, var, bits):
+        self.domains[var] |= bits
+
+    def keep_only(self, var, word):
+        bit = 1 << self.vocabulary.index[word]
+        self.prune(var, self.domains[var] & ~bit, count=False)
+
+    def domain_size(self, var):
+        return popcount(self.domains[var])
+
+    def revise(self, x, y):
+        """
+        Make variable `x` arc consistent with variable `y`, dropping at
+        once all words of `x` with a letter at the overlap that no word
+        of `y` has there.
+
+        Return True if a revision was made to the domain of `x`; return
+        False if no revision was made.
+        """
+        if x == y or self.crossword.overlaps[x, y] is None:
+            return False
+        i, j = self.crossword.overlaps[x, y]
+        letters = self.vocabulary.letters
+        xwords = self.domains[x]
+        ywords = self.domains[y]
+        for letter in self.vocabulary.alphabet.get(i, ()):
+            bucket = letters[i, letter]
+            if xwords & bucket and not ywords & letters.get((j, letter), 0):
+                xwords &= ~bucket
+        removed = self.domains[x] & ~xwords
+        self.prune(x, removed)
+        return bool(removed)
+
+    def order_domain_values(self, var, assignment):
+        """
+        Return the words in the domain of `var`, ordered by how many words
+        they rule out among its unassigned neighbors, fewest first.
+        """
+        letters = self.vocabulary.letters
+        neighbors = []
+        for neighbor, x, y in self.crossword.adjacency[var]:
+            if neighbor not in assignment:
+                neighbors.append((x, y, self.domains[neighbor], dict()))
+
+        # a word rules out the words of a neighbor without its letter at
+        # their overlap; count those once per neighbor and letter
+        def constrain(word):
+            count = 0
+            for x, y, words, ruled_out in neighbors:
+                letter = word[x]
+                if letter not in ruled_out:
+                    ruled_out[letter] = popcount(
+                        words & ~letters.get((y, letter), 0))
+                count += ruled_out[letter]
+            return count
+
+        return sorted(self.vocabulary.words_of(self.domains[var]),
+                      key=constrain)
+
+
+def main():
 
     # Parse command-line arguments
-    structure = sys.argv[1]
-    words = sys.argv[2]
-    output = sys.argv[3] if len(sys.argv) == 4 else None
+    parser = argparse.ArgumentParser(description="Generate a crossword.")
+    parser.add_argument("structure")
+    parser.add_argument("words")
+    parser.add_argument("output", nargs="?")
+    parser.add_argument("--bitsets", action="store_true",
+                        help="hold domains as bitsets over the vocabulary")
+    parser.add_argument("--no-inference", action="store_true",
+                        help="do not maintain arc consistency while searching")
+    parser.add_argument("--stats", action="store_true",
+                        help="report nodes explored and words pruned, "
+                        "counting the first arc consistency pass")
+    args = parser.parse_args()
+    output = args.output
 
     # Generate crossword
-    crossword = Crossword(structure, words)
-    creator = CrosswordCreator(crossword)
+    crossword = Crossword(args.structure, args.words)
+    if args.bitsets:
+        creator = BitsetCrosswordCreator(crossword)
+    else:
+        creator = CrosswordCreator(crossword)
+    creator.inference = not args.no_inference
     assignment = creator.solve()
 
     # Print result
@@ -301,6 +590,9 @@ def main():
         creator.print(assignment)
         if output:
             creator.save(assignment, output)
+    if args.stats:
+        print(f"Nodes explored: {creator.nodes}")
+        print(f"Words pruned: {creator.prunings}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+try:
+    popcount = int.bit_count
+except AttributeError:
+    # int.bit_count is new in Python 3.10
+    def popcount(bits):
+        return bin(bits).count("1")
+
+
+class WordBits():
+    """
+    Numbers every word of a vocabulary, so that a set of words can be held
+    as a Python int with bit i set when word i is in the set.
+
+    Words are numbered shortest first, so all words of one length occupy a
+    contiguous run of bits. `self.lengths` maps each length to the bitset
+    of words of that length, and `self.letters` maps (position, letter) to
+    the bitset of words with that letter at that position.
+    """
+
+    def __init__(self, words):
+        self.words = sorted(words, key=lambda word: (len(word), word))
+        self.index = {word: i for i, word in enumerate(self.words)}
+        self.all = (1 << len(self.words)) - 1
+
+        # Set the bits in bytearrays first, since or-ing bits into a large
+        # int one at a time copies the whole int every time
+        size = (len(self.words) + 7) // 8
+        letters = dict()
+        lengths = dict()
+        for i, word in enumerate(self.words):
+            lengths.setdefault(len(word), []).append(i)
+            for k, letter in enumerate(word):
+                key = (k, letter)
+                if key not in letters:
+                    letters[key] = bytearray(size)
+                letters[key][i >> 3] |= 1 << (i & 7)
+        self.letters = {
+            key: int.from_bytes(array, "little")
+            for key, array in letters.items()
+        }
+        self.lengths = {
+            length: ((1 << (indices[-1] + 1)) - 1) ^ ((1 << indices[0]) - 1)
+            for length, indices in lengths.items()
+        }
+
+        # Letters used at each position by any word
+        self.alphabet = dict()
+        for k, letter in self.letters:
+            self.alphabet.setdefault(k, []).append(letter)
+
+    def bits(self, words):
+        """Return the bitset of a collection of words."""
+        bits = 0
+        for word in words:
+            bits |= 1 << self.index[word]
+        return bits
+
+    def words_of(self, bits):
+        """Return the list of words in a bitset, in index order."""
+        words = []
+
+        # Read the bits a byte at a time rather than shifting the whole int
+        data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+        for i, byte in enumerate(data):
+            while byte:
+                low = byte & -byte
+                words.append(self.words[(i << 3) + low.bit_length() - 1])
+                byte ^= low
+        return words
@@ -0,0 +1,65 @@
+import argparse
+import random
+import time
+
+import degrees
+
+
+def benchmark(pairs, methods):
+    """
+    Runs every search method over the same (source, target) pairs.
+
+    Returns a dict mapping each method to its total people explored and
+    wall time, and checks that all methods agree on the degrees.
+    """
+    results = {method: {"explored": 0, "seconds": 0.0} for method in methods}
+    for source, target in pairs:
+        lengths = {}
+        for method in methods:
+            start = time.perf_counter()
+            path, num_explored = degrees.search_path(source, target, method)
+            results[method]["seconds"] += time.perf_counter() - start
+            results[method]["explored"] += num_explored
+            lengths[method] = None if path is None else len(path)
+        if len(set(lengths.values())) > 1:
+            raise AssertionError(
+                f"methods disagree for {source} -> {target}: {lengths}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare shortest path searches on random pairs.")
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--pairs", type=int, default=100)
+    parser.add_argument("--landmarks", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--methods", nargs="+",
+                        default=list(degrees.SEARCHES),
+                        choices=list(degrees.SEARCHES))
+    args = parser.parse_args()
+
+    print("Loading data...")
+    degrees.load_data(args.directory, compact=True)
+    start = time.perf_counter()
+    degrees.build_landmarks(args.landmarks)
+    print(f"Built {args.landmarks} landmarks in "
+          f"{time.perf_counter() - start:.2f}s.")
+
+    # Pairs of distinct people, since a person is zero degrees from themself
+    rng = random.Random(args.seed)
+    people = list(degrees.people)
+    pairs = [tuple(rng.sample(people, 2)) for _ in range(args.pairs)]
+
+    results = benchmark(pairs, args.methods)
+    print(f"{'method':<15}{'explored':>12}{'mean explored':>16}"
+          f"{'seconds':>10}{'ms/query':>10}")
+    for method, result in results.items():
+        explored = result["explored"]
+        seconds = result["seconds"]
+        print(f"{method:<15}{explored:>12}{explored / len(pairs):>16.1f}"
+              f"{seconds:>10.3f}{1000 * seconds / len(pairs):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
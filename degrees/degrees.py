@@ -1,6 +1,16 @@
+import argparse
+import collections
 import csv
+import functools
+import heapq
+import itertools
+import json
+import multiprocessing
 import sys
+import threading
 
+from graph import UNREACHABLE, Graph, Landmarks, MoviesView, PeopleView
+from nameindex import NameIndex
 from util import Node, StackFrontier, QueueFrontier
 
 # Maps names to a set of corresponding person_ids
@@ -12,11 +22,51 @@ people = {}
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
 
+# Most people whose neighbors are kept by the neighbor caches
+NEIGHBOR_CACHE_SIZE = 65536
 
-def load_data(directory):
+# Queries sent to a batch worker at a time, and chunks queued per worker
+BATCH_CHUNK_SIZE = 64
+BATCH_CHUNKS_IN_FLIGHT = 2
+
+# Compact graph backing the three tables above, when loaded with compact=True
+graph = None
+
+# Landmark distance index over the compact graph, once built
+landmarks = None
+
+# Sorted name index for prefix and fuzzy lookups, built on first use
+name_index = None
+
+# Held while the name index is being built
+name_index_lock = threading.Lock()
+
+
+def load_data(directory, compact=False, cache=True, workers=1):
     """
     Load data from CSV files into memory.
+
+    With `compact`, the data is held in an integer-indexed `Graph`
+    instead of per-person and per-movie sets, and `names`, `people`
+    and `movies` become read-only views over it. The graph is then
+    also saved as a binary snapshot in `directory` and memory-mapped
+    on later loads, unless `cache` is false, and up to `workers`
+    processes parse the CSV files when they have to be read.
     """
+    global graph, names, people, movies, landmarks
+    clear_neighbor_caches()
+    clear_name_index()
+    if compact:
+        load_graph(Graph.load(directory, cache=cache, workers=workers))
+        return
+
+    # Start from fresh dicts, dropping any compact graph loaded before
+    graph = None
+    landmarks = None
+    names = {}
+    people = {}
+    movies = {}
+
     # Load people
     with open(f"{directory}/people.csv", encoding="utf-8") as f:
         reader = csv.DictReader(f)
@@ -53,15 +103,81 @@ def load_data(directory):
                 pass
 
 
+def load_graph(new_graph):
+    """
+    Makes a compact `Graph` the data source for all lookups and searches.
+    """
+    global graph, names, people, movies, landmarks
+    clear_neighbor_caches()
+    clear_name_index()
+    graph = new_graph
+    landmarks = None
+    names = graph.names
+    people = PeopleView(graph)
+    movies = MoviesView(graph)
+
+
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--compact", action="store_true",
+                        help="hold the data in an integer-indexed graph")
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="do not read or write the graph snapshot")
+    parser.add_argument("--load-workers", type=int, default=1, metavar="N",
+                        help="processes used to parse the CSV files, "
+                             "counting this one; at most 3, one per file "
+                             "(with --compact)")
+    parser.add_argument("--method", default="bidirectional",
+                        choices=list(SEARCHES),
+                        help="search used to answer queries")
+    parser.add_argument("--landmarks", type=int, default=0, metavar="N",
+                        help="precompute distances from N landmark people "
+                             "(requires --compact)")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="answer tab-separated name/ID pairs from FILE "
+                             "('-' for stdin) as JSON lines")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used to answer batch queries")
+    args = parser.parse_args()
+    if args.landmarks and not args.compact:
+        parser.error("--landmarks requires --compact")
+
+    # In batch mode stdout carries results only, so report progress on stderr
+    log = sys.stderr if args.batch else sys.stdout
 
     # Load data from files into memory
-    print("Loading data...")
-    load_data(directory)
-    print("Data loaded.")
+    print("Loading data...", file=log)
+    load_data(args.directory, compact=args.compact, cache=args.cache,
+              workers=args.load_workers)
+    print("Data loaded.", file=log)
+    if graph is not None:
+        megabytes = graph.memory_usage() / 2 ** 20
+        source = "snapshot" if graph.from_snapshot else "CSV files"
+        print(f"Graph loaded from {source} in {graph.load_seconds:.2f}s, "
+              f"using about {megabytes:.1f} MB.", file=log)
+        for stats in graph.ingest_stats:
+            print(stats, file=log)
+    if args.landmarks:
+        build_landmarks(args.landmarks)
+        print(f"Built {args.landmarks} landmarks.", file=log)
+
+    if args.batch:
+        queries = sys.stdin if args.batch == "-" else open(
+            args.batch, encoding="utf-8")
+        with queries:
+            pairs = (line.rstrip("\n").split("\t") for line in queries
+                     if line.strip())
+            for result in batch_queries(pairs, workers=args.workers,
+                                        method=args.method,
+                                        directory=args.directory,
+                                        compact=args.compact):
+                print(json.dumps(result), flush=True)
+        return
+
+    # Build the name index while the user types, so a misspelt name does
+    # not wait for it
+    prepare_name_index()
 
     source = person_id_for_name(input("Name: "))
     if source is None:
@@ -70,7 +186,7 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)
+    path = shortest_path(source, target, method=args.method)
 
     if path is None:
         print("Not connected.")
@@ -85,16 +201,149 @@ def main():
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
-def shortest_path(source, target):
+def shortest_path(source, target, method="bfs"):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
+    `method` selects the search: "bfs" expands outward from the source
+    only, "bidirectional" expands from both ends and meets in the middle,
+    and "astar" is guided by the landmark index when one is built.
+
     If no possible path, returns None.
     """
+    path, _ = search_path(source, target, method)
+    return path
+
+
+def search_path(source, target, method="bfs"):
+    """
+    Runs the `shortest_path` search and returns a tuple of
+    (path, num_explored).
+    """
+    if method not in SEARCHES:
+        raise ValueError(f"unknown search method: {method}")
+    search = SEARCHES[method]
+
+    # Search over dense indices when the compact graph is loaded
+    if graph is not None:
+        source = graph.person_index[source]
+        target = graph.person_index[target]
+        options = {}
+        if landmarks is not None:
+
+            # Landmarks settle "Not connected" without searching
+            if not landmarks.connected(source, target):
+                return None, 0
+            if method == "astar":
+                options["heuristic"] = landmarks.heuristic(target)
+
+        path, num_explored = search(source, target, costar_indices,
+                                    graph.shared_movie, **options)
+        return graph.path_ids(path), num_explored
+
+    return search(source, target)
+
+
+def distances_from(source, max_depth=None):
+    """
+    Runs one breadth-first search from the source over everyone it
+    can reach, or only out to `max_depth` degrees when given.
+
+    Returns a tuple of (distances, parents): distances maps each
+    reachable person_id to their degrees of separation from the source,
+    and parents maps each of them except the source to the
+    (movie_id, person_id) they were reached through.
+    """
+    if graph is not None:
+        distance, parent, via = graph.distances_from(
+            graph.person_index[source], max_depth)
+        distances = {}
+        parents = {}
+
+        # Pick out the people reached without a Python loop over everyone
+        reached = itertools.compress(range(len(distance)),
+                                     map(UNREACHABLE.__ne__, distance))
+        for person in reached:
+            distances[graph.person_ids[person]] = distance[person]
+            if parent[person] != -1:
+                parents[graph.person_ids[person]] = (
+                    graph.movie_ids[via[person]],
+                    graph.person_ids[parent[person]])
+        return distances, parents
+
+    distances = {source: 0}
+    parents = {}
+    level = [source]
+    depth = 0
+    while level and (max_depth is None or depth < max_depth):
+        depth += 1
+        next_level = []
+        for person_id in level:
+            for movie_id, neighbor in neighbors_for_person(person_id):
+                if neighbor not in distances:
+                    distances[neighbor] = distances[person_id] + 1
+                    parents[neighbor] = (movie_id, person_id)
+                    next_level.append(neighbor)
+        level = next_level
+    return distances, parents
+
+
+def people_within(source, degrees):
+    """
+    Returns a dict of everyone within `degrees` degrees of the source,
+    mapped to their degrees of separation.
+    """
+    distances, _ = distances_from(source, degrees)
+    return distances
+
+
+def build_landmarks(count=16):
+    """
+    Precomputes a landmark distance index over the compact graph,
+    letting `shortest_path` reject unconnected pairs immediately and
+    `degree_bounds` answer without searching.
+    """
+    global landmarks
+    if graph is None:
+        raise ValueError("landmarks need data loaded with compact=True")
+    landmarks = Landmarks(graph, count)
+    return landmarks
+
+
+def degree_bounds(source, target):
+    """
+    Returns (lower, upper) bounds on the degrees of separation between
+    two people from the landmark index, or None if they are not
+    connected. `upper` is None when no landmark reaches them.
+    """
+    if landmarks is None:
+        raise ValueError("no landmark index; call build_landmarks() first")
+    a = graph.person_index[source]
+    b = graph.person_index[target]
+    if not landmarks.connected(a, b):
+        return None
+    return landmarks.lower_bound(a, b), landmarks.upper_bound(a, b)
+
+
+def breadth_first_search(source, target, neighbors=None, link=None):
+    """
+    Breadth-first search outward from the source.
+
+    `neighbors` maps a state to the distinct states next to it and
+    defaults to `costars_for_person`; `link` gives the action between
+    two neighboring states and defaults to `shared_movie`. Only the
+    path found is given its actions. Returns a tuple of
+    (path, num_explored), where path is None if the two people are not
+    connected.
+    """
+    if neighbors is None:
+        neighbors = costars_for_person
+    if link is None:
+        link = shared_movie
+    if source == target:
+        return [], 0
 
-    # TODO
-    
     # Keep track of number of states explored
     num_explored = 0
 
@@ -110,33 +359,298 @@ def shortest_path(source, target):
 
         # If nothing left in frontier, then no path
         if frontier.empty():
-            raise Exception("no solution")
+            return None, num_explored
 
         # Choose a node from the frontier
         node = frontier.remove()
         num_explored += 1
 
         # Add neighbors to frontier
-        for movie_id, person_id in neighbors_for_person(node.state):
+        for person_id in neighbors(node.state):
 
             # If node is the target, then we have a solution
             if person_id == target:
-                solution = [(movie_id, person_id)]
+                states = [person_id]
 
                 # Follow parent nodes to find solution
-                while node.parent is not None:
-                    solution.append((node.action, node.state))
+                while node is not None:
+                    states.append(node.state)
                     node = node.parent
-                solution.reverse()
-                return solution
-            
+                states.reverse()
+                return _linked_path(states, link), num_explored
+
             # If node is not the target, then add it to the frontier
             if not frontier.contains_state(person_id) and person_id not in explored:
-                child = Node(state=person_id, parent=node, action=movie_id)
+                child = Node(state=person_id, parent=node, action=None)
                 frontier.add(child)
 
         # Mark node as explored
-        explored.add(node.state)   
+        explored.add(node.state)
+
+
+def bidirectional_search(source, target, neighbors=None, link=None):
+    """
+    Breadth-first search run from both the source and the target at once.
+
+    On every step the smaller of the two frontiers is expanded by one full
+    level, so the search meets in the middle after visiting far fewer
+    people than a one-sided search. `neighbors` and `link` are as in
+    `breadth_first_search`.
+
+    Returns a tuple of (path, num_explored), where path is a list of
+    (movie_id, person_id) pairs as in `shortest_path`, or None if the
+    two people are not connected.
+    """
+    if neighbors is None:
+        neighbors = costars_for_person
+    if link is None:
+        link = shared_movie
+    if source == target:
+        return [], 0
+
+    # Each side maps a state to the state it was reached from
+    forward = {source: None}
+    backward = {target: None}
+    forward_frontier = [source]
+    backward_frontier = [target]
+    num_explored = 0
+
+    while forward_frontier and backward_frontier:
+
+        # Always grow the side with fewer states waiting to be expanded
+        expand_forward = len(forward_frontier) <= len(backward_frontier)
+        if expand_forward:
+            frontier, parents, others = forward_frontier, forward, backward
+        else:
+            frontier, parents, others = backward_frontier, backward, forward
+
+        # Expand the whole level so the first meeting found is the shortest
+        meeting = None
+        next_frontier = []
+        for state in frontier:
+            num_explored += 1
+            for neighbor in neighbors(state):
+                if neighbor in parents:
+                    continue
+                parents[neighbor] = state
+                if neighbor in others:
+                    meeting = neighbor
+                    break
+                next_frontier.append(neighbor)
+            if meeting is not None:
+                break
+
+        if meeting is not None:
+            states = _join_states(forward, backward, meeting)
+            return _linked_path(states, link), num_explored
+
+        if expand_forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+
+    return None, num_explored
+
+
+def _join_states(forward, backward, meeting):
+    """
+    Builds the list of states from the source to the target through
+    `meeting` from the parent links recorded by the two halves of a
+    bidirectional search.
+    """
+    states = []
+
+    # Walk back from the meeting point to the source
+    state = meeting
+    while state is not None:
+        states.append(state)
+        state = forward[state]
+    states.reverse()
+
+    # Walk forward from the meeting point to the target
+    state = backward[meeting]
+    while state is not None:
+        states.append(state)
+        state = backward[state]
+    return states
+
+
+def _linked_path(states, link):
+    """
+    Turns a list of states from the source to the target into the
+    (action, state) pairs after the source, asking `link` for the
+    action between each state and the next.
+    """
+    return [(link(a, b), b) for a, b in zip(states, states[1:])]
+
+
+def astar_search(source, target, neighbors=None, link=None, heuristic=None):
+    """
+    A* search from the source, expanding people in order of degrees so
+    far plus `heuristic`, an estimate of the degrees left to the target
+    that must never overestimate. Without a heuristic this is a
+    breadth-first search.
+
+    `neighbors` and `link` are as in `breadth_first_search`. Returns a
+    tuple of (path, num_explored) like `breadth_first_search`.
+    """
+    if neighbors is None:
+        neighbors = costars_for_person
+    if link is None:
+        link = shared_movie
+    if heuristic is None:
+        def heuristic(state):
+            return 0
+
+    # Each state maps to its parent state and its degrees so far
+    parents = {source: None}
+    cost = {source: 0}
+    explored = set()
+    num_explored = 0
+
+    # Ties are broken by insertion order, which keeps the search stable
+    counter = 0
+    frontier = [(heuristic(source), counter, source)]
+
+    while frontier:
+        _, _, state = heapq.heappop(frontier)
+        if state in explored:
+            continue
+        explored.add(state)
+        num_explored += 1
+
+        if state == target:
+            states = []
+            while state is not None:
+                states.append(state)
+                state = parents[state]
+            states.reverse()
+            return _linked_path(states, link), num_explored
+
+        next_cost = cost[state] + 1
+        for neighbor in neighbors(state):
+            if neighbor in explored:
+                continue
+            if neighbor in cost and cost[neighbor] <= next_cost:
+                continue
+            cost[neighbor] = next_cost
+            parents[neighbor] = state
+            counter += 1
+            heapq.heappush(frontier, (next_cost + heuristic(neighbor),
+                                      counter, neighbor))
+
+    return None, num_explored
+
+
+# Search functions selectable through shortest_path(method=...)
+SEARCHES = {
+    "bfs": breadth_first_search,
+    "bidirectional": bidirectional_search,
+    "astar": astar_search,
+}
+
+
+def resolve_person(text):
+    """
+    Returns the person_id for an IMDB id or a name, without prompting.
+
+    Raises LookupError if no one matches, or if a name is shared by
+    several people.
+    """
+    text = text.strip()
+    if text in people:
+        return text
+    person_ids = list(names.get(text.lower(), ()))
+    if len(person_ids) == 0:
+        raise LookupError(f"person not found: {text}")
+    if len(person_ids) > 1:
+        raise LookupError(f"ambiguous name: {text} "
+                          f"(IDs {', '.join(sorted(person_ids))})")
+    return person_ids[0]
+
+
+def answer_query(pair, method="bidirectional"):
+    """
+    Answers one (source, target) query given as names or IDs, returning
+    a JSON-serializable dict with the degrees and path, or an error.
+    """
+    result = {"query": list(pair)}
+    try:
+        if len(pair) != 2:
+            raise LookupError("expected a source and a target")
+        source = resolve_person(pair[0])
+        target = resolve_person(pair[1])
+    except LookupError as error:
+        result["error"] = str(error)
+        return result
+
+    path = shortest_path(source, target, method=method)
+    result["source"] = source
+    result["target"] = target
+    if path is None:
+        result["degrees"] = None
+        result["path"] = None
+    else:
+        result["degrees"] = len(path)
+        result["path"] = [
+            {"movie_id": movie_id, "person_id": person_id}
+            for movie_id, person_id in path
+        ]
+    return result
+
+
+def batch_queries(pairs, workers=1, method="bidirectional",
+                  directory=None, compact=False):
+    """
+    Yields `answer_query` results for an iterable of (source, target)
+    pairs, in order, as they become available.
+
+    With more than one worker, queries run in a process pool. Where
+    processes are forked, the workers share the already-loaded data
+    copy-on-write; elsewhere each worker loads `directory` itself (a
+    compact graph then maps the same snapshot file into every worker).
+    Only a few chunks of queries per worker are read ahead of the
+    results yielded, so `pairs` may be long or endless.
+    """
+    if workers <= 1:
+        for pair in pairs:
+            yield answer_query(pair, method)
+        return
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        initializer, initargs = None, ()
+    else:
+        context = multiprocessing.get_context()
+        initializer, initargs = _init_worker, (directory, compact)
+
+    # Pool.imap would read all of `pairs` up front, so submit chunks
+    # ourselves and keep only a few per worker in flight
+    pairs = iter(pairs)
+    pending = collections.deque()
+    with context.Pool(workers, initializer, initargs) as pool:
+        while True:
+            while len(pending) < BATCH_CHUNKS_IN_FLIGHT * workers:
+                chunk = list(itertools.islice(pairs, BATCH_CHUNK_SIZE))
+                if not chunk:
+                    break
+                pending.append(pool.apply_async(_answer_chunk,
+                                                (chunk, method)))
+            if not pending:
+                return
+            yield from pending.popleft().get()
+
+
+def _init_worker(directory, compact):
+    """
+    Loads the data in a pool worker that did not inherit it.
+    """
+    load_data(directory, compact=compact)
+
+
+def _answer_chunk(chunk, method):
+    return [answer_query(pair, method) for pair in chunk]
+
 
 def person_id_for_name(name):
     """
@@ -145,6 +659,10 @@ def person_id_for_name(name):
     """
     person_ids = list(names.get(name.lower(), set()))
     if len(person_ids) == 0:
+        suggestions = suggest_names(name, limit=5)
+        if suggestions:
+            print("Did you mean: " + ", ".join(
+                people[ids[0]]["name"] for _, ids in suggestions) + "?")
         return None
     elif len(person_ids) > 1:
         print(f"Which '{name}'?")
@@ -164,17 +682,125 @@ def person_id_for_name(name):
         return person_ids[0]
 
 
+def suggest_names(text, limit=10, max_distance=2):
+    """
+    Returns up to `limit` (lowercase name, person_ids) candidates for
+    `text`: the exact match, else names it is a prefix of, else names
+    within `max_distance` edits of it. Suitable for autocomplete.
+    """
+    return build_name_index().lookup(text, max_distance, limit)
+
+
+def build_name_index():
+    """
+    Returns the name index, building it first if needed; waits for
+    a build already started by `prepare_name_index`.
+    """
+    global name_index
+    with name_index_lock:
+        if name_index is None:
+            name_index = NameIndex(names)
+        return name_index
+
+
+def prepare_name_index():
+    """
+    Starts building the name index in a background thread.
+    """
+    threading.Thread(target=build_name_index, daemon=True).start()
+
+
+def clear_name_index():
+    """
+    Drops the name index, which is rebuilt from `names` on next use.
+    """
+    global name_index
+    with name_index_lock:
+        name_index = None
+
+
+@functools.lru_cache(maxsize=NEIGHBOR_CACHE_SIZE)
 def neighbors_for_person(person_id):
     """
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
+
+    Results are kept in an LRU cache, so the returned set is frozen.
     """
+    if graph is not None:
+        return frozenset(
+            (graph.movie_ids[movie], graph.person_ids[person])
+            for movie, person in graph.neighbors(
+                graph.person_index[person_id]))
+
     movie_ids = people[person_id]["movies"]
     neighbors = set()
     for movie_id in movie_ids:
         for person_id in movies[movie_id]["stars"]:
             neighbors.add((movie_id, person_id))
-    return neighbors
+    return frozenset(neighbors)
+
+
+@functools.lru_cache(maxsize=NEIGHBOR_CACHE_SIZE)
+def costars_for_person(person_id):
+    """
+    Returns a tuple of the distinct people who starred with a given
+    person, not including that person, without building a
+    (movie_id, person_id) pair per role.
+    """
+    if graph is not None:
+        return tuple(graph.person_ids[costar] for costar in
+                     costar_indices(graph.person_index[person_id]))
+
+    costars = set()
+    for movie_id in people[person_id]["movies"]:
+        costars.update(movies[movie_id]["stars"])
+    costars.discard(person_id)
+    return tuple(costars)
+
+
+@functools.lru_cache(maxsize=NEIGHBOR_CACHE_SIZE)
+def costar_indices(person):
+    """
+    Like `costars_for_person`, over the dense person indices of the
+    compact graph.
+    """
+    return graph.costars(person)
+
+
+def shared_movie(a, b):
+    """
+    Returns the movie_id of a movie two people starred in together,
+    or None if there is none.
+    """
+    if graph is not None:
+        movie = graph.shared_movie(graph.person_index[a],
+                                   graph.person_index[b])
+        return None if movie is None else graph.movie_ids[movie]
+
+    shared = people[a]["movies"] & people[b]["movies"]
+    return min(shared) if shared else None
+
+
+def neighbor_cache_stats():
+    """
+    Returns the hits, misses and sizes of the neighbor caches.
+    """
+    return {
+        "neighbors": neighbors_for_person.cache_info()._asdict(),
+        "costars": costars_for_person.cache_info()._asdict(),
+        "costar_indices": costar_indices.cache_info()._asdict(),
+    }
+
+
+def clear_neighbor_caches():
+    """
+    Empties the neighbor caches, which must not outlive the data they
+    were filled from.
+    """
+    neighbors_for_person.cache_clear()
+    costars_for_person.cache_clear()
+    costar_indices.cache_clear()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,665 @@
+import json
+import mmap
+import os
+import sys
+import time
+import zlib
+from array import array
+from collections.abc import Mapping
+from itertools import accumulate
+
+from ingest import CHUNK_SIZE, read_tables
+
+# CSV files a graph is built from
+SOURCES = ("people.csv", "movies.csv", "stars.csv")
+
+# Name of the binary snapshot kept next to the CSV files
+SNAPSHOT = "graph.snapshot"
+SNAPSHOT_MAGIC = b"DEGRAPH3"
+
+# Distance recorded for people a search never reached
+UNREACHABLE = -1
+
+# Snapshot array fields, with their array typecodes
+ARRAYS = (
+    ("person_offsets", "q"),
+    ("person_movies", "i"),
+    ("movie_offsets", "q"),
+    ("movie_people", "i"),
+)
+
+# Snapshot string tables, in the order they are stored
+TABLES = ("person_ids", "person_names", "births",
+          "movie_ids", "titles", "years")
+
+
+class Graph():
+    """
+    Compact person/movie graph.
+
+    People and movies are numbered densely from 0, and the set of movies
+    each person starred in (and the people starring in each movie) is
+    stored in compressed sparse row (CSR) form: for person `p`, their
+    movies are `person_movies[person_offsets[p]:person_offsets[p + 1]]`.
+    This avoids a Python set per person and per movie.
+    """
+
+    def __init__(self):
+        # Dense index <-> IMDB id, plus the details shown to the user
+        self.person_ids = []
+        self.person_index = {}
+        self.births = []
+        self.person_names = []
+        self.movie_ids = []
+        self.movie_index = {}
+        self.titles = []
+        self.years = []
+
+        # Maps lowercase names to a tuple of person_ids
+        self.names = {}
+
+        # CSR incidence in both directions
+        self.person_offsets = array("q", [0])
+        self.person_movies = array("i")
+        self.movie_offsets = array("q", [0])
+        self.movie_people = array("i")
+
+        # Seconds spent building the graph, and whether it came from a snapshot
+        self.load_seconds = 0.0
+        self.from_snapshot = False
+
+        # IngestStats per CSV file, when built from CSV files
+        self.ingest_stats = []
+
+        # Keeps a memory-mapped snapshot open while its arrays are in use
+        self._mmap = None
+
+    @classmethod
+    def load(cls, directory, cache=True, workers=1):
+        """
+        Loads the graph for `directory`.
+
+        With `cache`, a binary snapshot is memory-mapped if one exists
+        and is still current for the CSV files; otherwise the CSV files
+        are parsed (by up to `workers` processes) and a fresh snapshot
+        is written for next time.
+        """
+        if not cache:
+            return cls.from_csv(directory, workers)
+
+        path = os.path.join(directory, SNAPSHOT)
+        stamps = source_stamps(directory)
+        try:
+            return cls.from_snapshot_file(path, stamps)
+        except (OSError, ValueError):
+            pass
+
+        graph = cls.from_csv(directory, workers)
+        try:
+            graph.save_snapshot(path, stamps)
+        except OSError:
+            # A read-only data directory just means no warm start
+            pass
+        return graph
+
+    @classmethod
+    def from_csv(cls, directory, workers=1, chunk_size=CHUNK_SIZE):
+        """
+        Builds a graph from the people, movies and stars CSV files
+        in `directory`, streaming them in chunks of `chunk_size` rows.
+
+        With more than one worker, up to that many processes (this
+        one included, and at most one per file) parse the files at once.
+        """
+        start = time.perf_counter()
+        graph = cls()
+        tables = read_tables(directory, workers, chunk_size)
+
+        # Load people
+        chunks, _ = tables["people"]
+        for person_ids, person_names, births in chunks:
+            for person_id, name, birth in zip(person_ids, person_names,
+                                              births):
+                graph.add_person(person_id, name, birth)
+
+        # Load movies
+        chunks, _ = tables["movies"]
+        for movie_ids, titles, years in chunks:
+            for movie_id, title, year in zip(movie_ids, titles, years):
+                graph.add_movie(movie_id, title, year)
+
+        # Load stars, skipping rows that refer to unknown ids
+        person_column = array("i")
+        movie_column = array("i")
+        chunks, _ = tables["stars"]
+        for person_ids, movie_ids in chunks:
+            for person_id, movie_id in zip(person_ids, movie_ids):
+                person = graph.person_index.get(person_id)
+                movie = graph.movie_index.get(movie_id)
+                if person is None or movie is None:
+                    continue
+                person_column.append(person)
+                movie_column.append(movie)
+
+        graph.build_edges(person_column, movie_column)
+        graph.ingest_stats = [stats for _, stats in tables.values()]
+        graph.load_seconds = time.perf_counter() - start
+        return graph
+
+    @classmethod
+    def from_snapshot_file(cls, path, stamps=None):
+        """
+        Memory-maps a snapshot written by `save_snapshot`.
+
+        Raises ValueError if the file is not a snapshot, cannot be
+        decoded (as when it was truncated), or if `stamps` is given and
+        does not match the stamps the snapshot was taken at.
+        """
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Check and decode everything before mapping any array, so the
+        # file can still be closed if it turns out to be unusable
+        graph = cls()
+        try:
+            if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a graph snapshot")
+            position = len(SNAPSHOT_MAGIC)
+            header_size = int.from_bytes(mapped[position:position + 8],
+                                         "little")
+            position += 8
+            header = json.loads(mapped[position:position + header_size])
+            if stamps is not None and header["sources"] != stamps:
+                raise ValueError(f"{path} is out of date")
+
+            # Sections are laid out after the header at the offsets it lists
+            base = _padded(position + header_size)
+            sections = {}
+            for name, typecode in ARRAYS:
+                offset, size, checksum = header["arrays"][name]
+                sections[name] = _section(mapped, base + offset, size,
+                                          array(typecode).itemsize, checksum)
+            offset, size, checksum = header["tables"]
+            start_offset, end = _section(mapped, base + offset, size, 1,
+                                         checksum)
+            tables = _decode_strings(mapped[start_offset:end], len(TABLES))
+            for name, strings in zip(TABLES, tables):
+                setattr(graph, name, strings)
+            _check_shape(graph, sections)
+        except ValueError:
+            mapped.close()
+            raise
+        except (KeyError, TypeError, IndexError) as error:
+            # A header missing fields, or with fields of the wrong type
+            mapped.close()
+            raise ValueError(f"{path} is corrupt") from error
+
+        view = memoryview(mapped)
+        for name, typecode in ARRAYS:
+            offset, end = sections[name]
+            setattr(graph, name, view[offset:end].cast(typecode))
+        graph.person_index = {
+            person_id: i for i, person_id in enumerate(graph.person_ids)}
+        graph.movie_index = {
+            movie_id: i for i, movie_id in enumerate(graph.movie_ids)}
+        for person_id, name in zip(graph.person_ids, graph.person_names):
+            key = name.lower()
+            graph.names[key] = graph.names.get(key, ()) + (person_id,)
+
+        graph._mmap = mapped
+        graph.from_snapshot = True
+        graph.load_seconds = time.perf_counter() - start
+        return graph
+
+    def save_snapshot(self, path, stamps):
+        """
+        Writes the graph to `path` in a form `from_snapshot_file` can
+        memory-map, recording the CSV `stamps` it was built from.
+        """
+        tables = _encode_strings(
+            [getattr(self, name) for name in TABLES])
+
+        # Lay the arrays out back to back, each aligned to 8 bytes
+        blobs = [bytes(getattr(self, name)) for name, _ in ARRAYS]
+        layout = {}
+        offset = 0
+        for (name, _), blob in zip(ARRAYS, blobs):
+            layout[name] = [offset, len(blob), zlib.crc32(blob)]
+            offset += _padded(len(blob))
+        header = {"sources": stamps, "arrays": layout,
+                  "tables": [offset, len(tables), zlib.crc32(tables)]}
+        encoded = json.dumps(header).encode()
+        position = len(SNAPSHOT_MAGIC) + 8 + len(encoded)
+        padding = _padded(position) - position
+
+        # Write to a temporary file first so readers never see half a file
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(len(encoded).to_bytes(8, "little"))
+            f.write(encoded)
+            f.write(bytes(padding))
+            for blob in blobs:
+                f.write(blob)
+                f.write(bytes(_padded(len(blob)) - len(blob)))
+            f.write(tables)
+        os.replace(temporary, path)
+
+    def add_person(self, person_id, name, birth):
+        """
+        Registers a person and returns their dense index.
+        """
+        index = len(self.person_ids)
+        self.person_index[person_id] = index
+        self.person_ids.append(person_id)
+        self.person_names.append(name)
+        self.births.append(birth)
+        key = name.lower()
+        self.names[key] = self.names.get(key, ()) + (person_id,)
+        return index
+
+    def add_movie(self, movie_id, title, year):
+        """
+        Registers a movie and returns its dense index.
+        """
+        index = len(self.movie_ids)
+        self.movie_index[movie_id] = index
+        self.movie_ids.append(movie_id)
+        self.titles.append(title)
+        self.years.append(year)
+        return index
+
+    def build_edges(self, person_column, movie_column):
+        """
+        Fills the CSR arrays from parallel arrays of (person, movie)
+        index pairs, one pair per starring role.
+        """
+        self.person_offsets, self.person_movies = _csr(
+            len(self.person_ids), person_column, movie_column)
+        self.movie_offsets, self.movie_people = _csr(
+            len(self.movie_ids), movie_column, person_column)
+
+    def movies_of(self, person):
+        """
+        Returns the dense movie indices a person starred in.
+        """
+        offsets = self.person_offsets
+        return self.person_movies[offsets[person]:offsets[person + 1]]
+
+    def stars_of(self, movie):
+        """
+        Returns the dense person indices starring in a movie.
+        """
+        offsets = self.movie_offsets
+        return self.movie_people[offsets[movie]:offsets[movie + 1]]
+
+    def neighbors(self, person):
+        """
+        Yields (movie, person) index pairs for people who starred
+        with a given person.
+        """
+        for movie in self.movies_of(person):
+            for star in self.stars_of(movie):
+                yield movie, star
+
+    def costars(self, person):
+        """
+        Returns a tuple of the distinct person indices who starred with
+        a given person, not including that person.
+        """
+        costars = set()
+        for movie in self.movies_of(person):
+            costars.update(self.stars_of(movie))
+        costars.discard(person)
+        return tuple(costars)
+
+    def shared_movie(self, a, b):
+        """
+        Returns the index of a movie persons `a` and `b` both starred
+        in, or None if there is none.
+        """
+        movies = set(self.movies_of(b))
+        for movie in self.movies_of(a):
+            if movie in movies:
+                return movie
+        return None
+
+    def distances_from(self, source, max_depth=None):
+        """
+        Breadth-first search from person index `source` over the whole
+        graph, or only out to `max_depth` degrees when given.
+
+        Returns three arrays indexed by person: the degrees of separation
+        from the source (UNREACHABLE if not connected), and the person and
+        movie each person was reached through (-1 for the source and for
+        unreachable people).
+        """
+        size = len(self.person_ids)
+        distance = array("i", [UNREACHABLE]) * size
+        parent = array("i", [-1]) * size
+        via = array("i", [-1]) * size
+
+        # A movie connects all of its stars at once, so expand it only once
+        expanded = bytearray(len(self.movie_ids))
+
+        distance[source] = 0
+        level = [source]
+        depth = 0
+        while level and (max_depth is None or depth < max_depth):
+            depth += 1
+            next_level = []
+            for person in level:
+                for movie in self.movies_of(person):
+                    if expanded[movie]:
+                        continue
+                    expanded[movie] = 1
+                    for star in self.stars_of(movie):
+                        if distance[star] == UNREACHABLE:
+                            distance[star] = depth
+                            parent[star] = person
+                            via[star] = movie
+                            next_level.append(star)
+            level = next_level
+        return distance, parent, via
+
+    def components(self):
+        """
+        Returns an array labelling each person with the index of the
+        connected component they belong to.
+        """
+        labels = array("i", [-1]) * len(self.person_ids)
+        expanded = bytearray(len(self.movie_ids))
+        label = 0
+        for start in range(len(self.person_ids)):
+            if labels[start] != -1:
+                continue
+            labels[start] = label
+            stack = [start]
+            while stack:
+                person = stack.pop()
+                for movie in self.movies_of(person):
+                    if expanded[movie]:
+                        continue
+                    expanded[movie] = 1
+                    for star in self.stars_of(movie):
+                        if labels[star] == -1:
+                            labels[star] = label
+                            stack.append(star)
+            label += 1
+        return labels
+
+    def degree(self, person):
+        """
+        Returns the number of movies a person starred in.
+        """
+        return self.person_offsets[person + 1] - self.person_offsets[person]
+
+    def path_ids(self, path):
+        """
+        Converts a path of (movie, person) indices into
+        (movie_id, person_id) pairs.
+        """
+        if path is None:
+            return None
+        return [(self.movie_ids[movie], self.person_ids[person])
+                for movie, person in path]
+
+    def memory_usage(self):
+        """
+        Returns an estimate, in bytes, of the memory held by the graph.
+        """
+        total = 0
+        for table in (self.person_offsets, self.person_movies,
+                      self.movie_offsets, self.movie_people):
+            total += sys.getsizeof(table)
+        for table in (self.person_ids, self.person_names, self.births,
+                      self.movie_ids, self.titles, self.years):
+            total += sys.getsizeof(table)
+            total += sum(sys.getsizeof(item) for item in table)
+        for index in (self.person_index, self.movie_index, self.names):
+            total += sys.getsizeof(index)
+        total += sum(sys.getsizeof(ids) for ids in self.names.values())
+        return total
+
+
+class Landmarks():
+    """
+    Precomputed distances from a few well-connected people.
+
+    Connected components answer "are these two people connected at all"
+    immediately, and by the triangle inequality the distances from each
+    landmark L bound the degrees between any a and b:
+
+        |d(L, a) - d(L, b)| <= d(a, b) <= d(L, a) + d(L, b)
+    """
+
+    def __init__(self, graph, count=16):
+        self.graph = graph
+        self.component = graph.components()
+
+        # Use the people with the most movies as landmarks
+        people = range(len(graph.person_ids))
+        self.people = sorted(people, key=graph.degree, reverse=True)[:count]
+        self.distances = [graph.distances_from(person)[0]
+                          for person in self.people]
+
+    def connected(self, a, b):
+        """
+        Returns whether person indices `a` and `b` are connected.
+        """
+        return self.component[a] == self.component[b]
+
+    def lower_bound(self, a, b):
+        """
+        Returns a lower bound on the degrees between `a` and `b`,
+        assuming they are connected.
+        """
+        bound = 0
+        for distance in self.distances:
+            if distance[a] != UNREACHABLE and distance[b] != UNREACHABLE:
+                bound = max(bound, abs(distance[a] - distance[b]))
+        return bound
+
+    def upper_bound(self, a, b):
+        """
+        Returns an upper bound on the degrees between `a` and `b`,
+        or None if no landmark reaches both.
+        """
+        bound = None
+        for distance in self.distances:
+            if distance[a] != UNREACHABLE and distance[b] != UNREACHABLE:
+                through = distance[a] + distance[b]
+                if bound is None or through < bound:
+                    bound = through
+        return bound
+
+    def heuristic(self, target):
+        """
+        Returns a function estimating the degrees from a person index to
+        `target` by the landmark lower bound. It never overestimates, and
+        is consistent, so A* search with it finds shortest paths.
+        """
+        tables = [(distance, distance[target]) for distance in self.distances
+                  if distance[target] != UNREACHABLE]
+
+        def estimate(person):
+            bound = 0
+            for distance, to_target in tables:
+                difference = abs(distance[person] - to_target)
+                if difference > bound:
+                    bound = difference
+            return bound
+
+        return estimate
+
+
+class PeopleView(Mapping):
+    """
+    Read-only view of a graph shaped like `degrees.people`.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, person_id):
+        graph = self.graph
+        person = graph.person_index[person_id]
+        return {
+            "name": graph.person_names[person],
+            "birth": graph.births[person],
+            "movies": {graph.movie_ids[movie]
+                       for movie in graph.movies_of(person)}
+        }
+
+    def __iter__(self):
+        return iter(self.graph.person_ids)
+
+    def __len__(self):
+        return len(self.graph.person_ids)
+
+
+class MoviesView(Mapping):
+    """
+    Read-only view of a graph shaped like `degrees.movies`.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, movie_id):
+        graph = self.graph
+        movie = graph.movie_index[movie_id]
+        return {
+            "title": graph.titles[movie],
+            "year": graph.years[movie],
+            "stars": {graph.person_ids[person]
+                      for person in graph.stars_of(movie)}
+        }
+
+    def __iter__(self):
+        return iter(self.graph.movie_ids)
+
+    def __len__(self):
+        return len(self.graph.movie_ids)
+
+
+def source_stamps(directory):
+    """
+    Returns the modification time and size of each CSV file, used to
+    tell whether a snapshot is still current.
+    """
+    stamps = {}
+    for name in SOURCES:
+        info = os.stat(os.path.join(directory, name))
+        stamps[name] = [info.st_mtime_ns, info.st_size]
+    return stamps
+
+
+def _section(mapped, offset, size, itemsize, checksum):
+    """
+    Returns the (start, end) of a snapshot section, raising ValueError
+    unless it lies within the file, holds whole items and matches its
+    CRC-32 `checksum`, so damaged bytes are caught before they are used.
+    """
+    if offset < 0 or size < 0 or offset + size > len(mapped) \
+            or size % itemsize:
+        raise ValueError("snapshot section out of bounds")
+    with memoryview(mapped) as view, view[offset:offset + size] as data:
+        if zlib.crc32(data) != checksum:
+            raise ValueError("snapshot section fails its checksum")
+    return offset, offset + size
+
+
+def _check_shape(graph, sections):
+    """
+    Raises ValueError unless the decoded tables and CSR arrays agree on
+    the number of people and movies.
+    """
+    if not (len(graph.person_ids) == len(graph.person_names)
+            == len(graph.births)):
+        raise ValueError("snapshot people tables differ in length")
+    if not len(graph.movie_ids) == len(graph.titles) == len(graph.years):
+        raise ValueError("snapshot movie tables differ in length")
+    for name, count in (("person_offsets", len(graph.person_ids)),
+                        ("movie_offsets", len(graph.movie_ids))):
+        start, end = sections[name]
+        if (end - start) // array("q").itemsize != count + 1:
+            raise ValueError(f"snapshot {name} has the wrong length")
+
+
+def _encode_strings(tables):
+    """
+    Encodes lists of strings as length-prefixed UTF-8. Each list is
+    stored as its count, then the length of every string in characters,
+    then the size and bytes of all the strings encoded together.
+    """
+    parts = []
+    for strings in tables:
+        lengths = array("I", [len(string) for string in strings])
+        payload = "".join(strings).encode("utf-8")
+        parts.append(len(strings).to_bytes(8, "little"))
+        parts.append(lengths.tobytes())
+        parts.append(len(payload).to_bytes(8, "little"))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def _decode_strings(data, count):
+    """
+    Decodes `count` lists of strings written by `_encode_strings`,
+    raising ValueError if `data` does not hold exactly that.
+    """
+    tables = []
+    itemsize = array("I").itemsize
+    position = 0
+    for _ in range(count):
+        size = int.from_bytes(data[position:position + 8], "little")
+        position += 8
+        lengths = array("I")
+        lengths.frombytes(data[position:position + size * itemsize])
+        if len(lengths) != size:
+            raise ValueError("snapshot string table truncated")
+        position += size * itemsize
+
+        payload_size = int.from_bytes(data[position:position + 8], "little")
+        position += 8
+        if position + payload_size > len(data):
+            raise ValueError("snapshot string table truncated")
+        text = data[position:position + payload_size].decode("utf-8")
+        position += payload_size
+
+        ends = list(accumulate(lengths))
+        if (ends[-1] if ends else 0) != len(text):
+            raise ValueError("snapshot string lengths do not match")
+        tables.append([text[end - length:end]
+                       for end, length in zip(ends, lengths)])
+    if position != len(data):
+        raise ValueError("snapshot string tables have trailing data")
+    return tables
+
+
+def _padded(size):
+    """
+    Rounds `size` up to a multiple of 8 bytes.
+    """
+    return (size + 7) // 8 * 8
+
+
+def _csr(size, rows, columns):
+    """
+    Groups `columns` by `rows` into (offsets, values) CSR arrays
+    for `size` rows.
+    """
+    offsets = array("q", bytes(8 * (size + 1)))
+    for row in rows:
+        offsets[row + 1] += 1
+    for i in range(size):
+        offsets[i + 1] += offsets[i]
+
+    values = array("i", bytes(4 * len(columns)))
+    cursor = array("q", offsets[:-1])
+    for row, column in zip(rows, columns):
+        values[cursor[row]] = column
+        cursor[row] += 1
+    return offsets, values
@@ -0,0 +1,152 @@
+import csv
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+
+# Rows parsed per chunk
+CHUNK_SIZE = 65536
+
+# Chunks a worker may parse ahead of the reader before it waits
+QUEUE_CHUNKS = 4
+
+# Each table's file, the columns kept from it, and the columns whose
+# values repeat often enough to be worth interning
+TABLES = {
+    "people": ("people.csv", ("id", "name", "birth"), ("birth",)),
+    "movies": ("movies.csv", ("id", "title", "year"), ("year",)),
+    "stars": ("stars.csv", ("person_id", "movie_id"),
+              ("person_id", "movie_id")),
+}
+
+
+class IngestStats():
+    """
+    Rows read from one CSV file and the seconds spent parsing them.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.name}: {self.rows} rows in {self.seconds:.2f}s "
+                f"({self.rows_per_second:,.0f} rows/s)")
+
+
+def read_chunks(directory, table, stats, chunk_size=CHUNK_SIZE):
+    """
+    Yields a table's wanted columns in chunks of at most `chunk_size`
+    rows, as a tuple of equal-length column tuples, so only one chunk
+    of rows is in memory at a time.
+
+    Parsing time and row counts are added to `stats`.
+    """
+    filename, columns, interned = TABLES[table]
+    with open(os.path.join(directory, filename),
+              encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        indices = [header.index(column) for column in columns]
+        while True:
+            start = time.perf_counter()
+            rows = list(itertools.islice(reader, chunk_size))
+            if not rows:
+                break
+
+            # csv.reader gives blank lines as empty rows
+            rows = [row for row in rows if row]
+            if not rows:
+                continue
+
+            # Pick out the columns asked for, reading fields missing from
+            # short rows as empty
+            chunk = []
+            for column, index in zip(columns, indices):
+                values = tuple(row[index] if index < len(row) else ""
+                               for row in rows)
+                if column in interned:
+                    values = tuple(map(sys.intern, values))
+                chunk.append(values)
+
+            stats.rows += len(rows)
+            stats.seconds += time.perf_counter() - start
+            yield tuple(chunk)
+
+
+def read_tables(directory, workers=1, chunk_size=CHUNK_SIZE):
+    """
+    Returns a dict mapping each table name to a tuple of (chunks, stats).
+
+    Chunks are generators that yield as they are consumed; stats fill in
+    as they go. Tables are parsed by up to `workers` processes counting
+    this one, and since there is at most one per table, by no more than
+    three. This process parses the first tables lazily as they are
+    consumed; each of the last `workers - 1` is parsed in a process of
+    its own, which hands its chunks over through a queue holding at most
+    QUEUE_CHUNKS of them. Either way memory stays bounded by the chunk
+    size.
+    """
+    tables = {}
+    names = list(TABLES)
+    local = len(names) - (min(max(workers, 1), len(names)) - 1)
+    for table in names[:local]:
+        stats = IngestStats(table)
+        tables[table] = (
+            read_chunks(directory, table, stats, chunk_size), stats)
+
+    # Start the other workers now so they parse while this process
+    # works through the tables before theirs
+    context = multiprocessing.get_context()
+    for table in names[local:]:
+        stats = IngestStats(table)
+        queue = context.Queue(QUEUE_CHUNKS)
+        process = context.Process(target=_send_chunks, daemon=True,
+                                  args=(directory, table, chunk_size, queue))
+        process.start()
+        tables[table] = (_receive_chunks(queue, process, stats), stats)
+    return tables
+
+
+def _send_chunks(directory, table, chunk_size, queue):
+    """
+    Parses a table in a worker process, putting each chunk on `queue`
+    and then ("done", stats), or ("error", exception) if parsing fails.
+    """
+    stats = IngestStats(table)
+    try:
+        for chunk in read_chunks(directory, table, stats, chunk_size):
+            queue.put(("chunk", chunk))
+    except Exception as error:
+        queue.put(("error", error))
+    else:
+        queue.put(("done", stats))
+
+
+def _receive_chunks(queue, process, stats):
+    """
+    Yields the chunks a worker puts on `queue`, copying its stats into
+    `stats` at the end. The worker is stopped if the chunks are not
+    all consumed.
+    """
+    try:
+        while True:
+            kind, value = queue.get()
+            if kind == "chunk":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                stats.rows = value.rows
+                stats.seconds = value.seconds
+                return
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
@@ -0,0 +1,196 @@
+import argparse
+import importlib.util
+import json
+import random
+import time
+import tracemalloc
+
+from logic import (And, Biconditional, Implication, Not, Or, Sentence, Symbol,
+                   model_check, model_check_many)
+from knowledgebase import KnowledgeBase
+
+# Engines whose work happens in other processes, out of tracemalloc's sight
+UNTRACED = {"parallel"}
+
+# Engines that may enumerate every model, and so only run on small puzzles
+EXHAUSTIVE = {"enumerate", "compiled", "bitwise", "numpy", "parallel",
+              "many", "simplify"}
+
+
+class Counted(Sentence):
+    """
+    Wraps a knowledge base to count how many models it is evaluated in.
+    Only the "enumerate" engine accepts it, since the others inspect
+    the sentence's structure rather than calling evaluate.
+    """
+
+    # Counting must not pay for the hash-consing guard on every update
+    __setattr__ = object.__setattr__
+
+    def __init__(self, sentence):
+        self.sentence = sentence
+        self.count = 0
+
+    def evaluate(self, model):
+        self.count += 1
+        return self.sentence.evaluate(model)
+
+    def symbols(self):
+        return self.sentence.symbols()
+
+
+def generate_puzzle(characters, rng, depth=2):
+    """
+    Generates a knights and knaves puzzle with `characters` characters,
+    each making one random statement about the others.
+
+    A hidden role is chosen for everyone first, and each statement is
+    negated if needed so that knights tell the truth and knaves lie, so
+    the knowledge base always has at least one model.
+
+    Returns a tuple of (knowledge, queries).
+    """
+    names = [f"Character {i}" for i in range(characters)]
+    knights = [Symbol(f"{name} is a Knight") for name in names]
+    knaves = [Symbol(f"{name} is a Knave") for name in names]
+    roles = {knight.name: rng.random() < 0.5 for knight in knights}
+
+    knowledge = And()
+    for knight, knave in zip(knights, knaves):
+
+        # Each character is either a knight or a knave, but not both
+        knowledge.add(Biconditional(knight, Not(knave)))
+
+    for knight in knights:
+        statement = _random_statement(knights, knaves, rng, depth)
+        if statement.evaluate(_full_model(roles)) != roles[knight.name]:
+            statement = Not(statement)
+        knowledge.add(Biconditional(knight, statement))
+
+    return knowledge, knights + knaves
+
+
+def _full_model(roles):
+    model = dict(roles)
+    for name, knight in roles.items():
+        model[name.replace("Knight", "Knave")] = not knight
+    return model
+
+
+def _random_statement(knights, knaves, rng, depth):
+    if depth == 0 or rng.random() < 0.3:
+        return rng.choice(knights + knaves)
+    connective = rng.choice([Not, And, Or, Implication, Biconditional])
+    if connective is Not:
+        return Not(_random_statement(knights, knaves, rng, depth - 1))
+    return connective(_random_statement(knights, knaves, rng, depth - 1),
+                      _random_statement(knights, knaves, rng, depth - 1))
+
+
+def run_engine(engine, knowledge, queries):
+    """
+    Answers every query with one engine.
+
+    Returns a tuple of (answers, models visited or None if the engine
+    does not evaluate models one at a time).
+    """
+    if engine == "many":
+        return model_check_many(knowledge, queries), None
+    if engine == "knowledgebase":
+        kb = KnowledgeBase(knowledge)
+        return [kb.ask(query) for query in queries], None
+    if engine == "enumerate":
+        counted = Counted(knowledge)
+        answers = [model_check(counted, query) for query in queries]
+        return answers, counted.count
+    return [model_check(knowledge, query, engine) for query in queries], None
+
+
+def benchmark(sizes, engines, seed=0, max_exhaustive=16):
+    """
+    Times each engine on one generated puzzle per size.
+
+    Each engine is timed in a run of its own, and then run again under
+    tracemalloc for its peak memory, since tracing slows engines down
+    unevenly. Peak memory is None for engines working in other processes,
+    and models visited is None for engines other than "enumerate".
+
+    Engines that enumerate all models are skipped once a puzzle has more
+    than `max_exhaustive` symbols. Returns a list of result dicts, and
+    raises AssertionError if two engines disagree.
+    """
+    rng = random.Random(seed)
+    results = []
+    for size in sizes:
+        knowledge, queries = generate_puzzle(size, rng)
+        expected = None
+        for engine in engines:
+            if engine in EXHAUSTIVE and 2 * size > max_exhaustive:
+                continue
+
+            start = time.perf_counter()
+            answers, models = run_engine(engine, knowledge, queries)
+            seconds = time.perf_counter() - start
+
+            peak = None
+            if engine not in UNTRACED:
+                tracemalloc.start()
+                run_engine(engine, knowledge, queries)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+            if expected is None:
+                expected = answers
+            elif answers != expected:
+                raise AssertionError(
+                    f"{engine} disagrees on the puzzle of size {size}")
+            results.append({
+                "characters": size,
+                "engine": engine,
+                "seconds": seconds,
+                "models": models,
+                "peak_bytes": peak,
+            })
+    return results
+
+
+def main():
+    engines = ["enumerate", "compiled", "bitwise", "many", "parallel",
+               "simplify", "sat", "knowledgebase"]
+    if importlib.util.find_spec("numpy") is not None:
+        engines.insert(3, "numpy")
+
+    parser = argparse.ArgumentParser(
+        description="Time inference engines on generated puzzles.")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[2, 4, 6, 8, 16, 32])
+    parser.add_argument("--engines", nargs="+", default=engines,
+                        choices=engines)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-exhaustive", type=int, default=16,
+                        help="most symbols to enumerate all models of")
+    parser.add_argument("--json", action="store_true",
+                        help="print results as JSON lines")
+    args = parser.parse_args()
+
+    results = benchmark(args.sizes, args.engines, args.seed,
+                        args.max_exhaustive)
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+
+    print(f"{'chars':>5}  {'engine':<14}{'seconds':>10}{'models':>10}"
+          f"{'peak KB':>10}")
+    for result in results:
+        models = "-" if result["models"] is None else result["models"]
+        peak = ("-" if result["peak_bytes"] is None
+                else f"{result['peak_bytes'] / 1024:.1f}")
+        print(f"{result['characters']:>5}  {result['engine']:<14}"
+              f"{result['seconds']:>10.4f}{models:>10}{peak:>10}")
+    print("- : not measured (models are only counted by enumerate, and "
+          "memory in other processes is not traced)")
+
+
+if __name__ == "__main__":
+    main()
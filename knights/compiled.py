@@ -0,0 +1,217 @@
+import itertools
+
+from logic import And, Biconditional, Implication, Not, Or, Symbol
+
+# Models evaluated together by the bit-parallel engine: 2 ** BLOCK_BITS
+BLOCK_BITS = 6
+
+# Models per uint64 word, and per chunk of the NumPy truth table
+WORD_BITS = 6
+CHUNK_BITS = 20
+
+
+class CompiledSentence():
+    """
+    A sentence compiled to flat Python functions over symbol indices.
+
+    `evaluate(values)` takes a sequence of booleans, one per symbol in
+    `self.symbols`, and returns the sentence's truth value.
+
+    `evaluate_bits(columns, mask)` evaluates many models at once: each
+    column holds one symbol's value in every model as the bits of an
+    integer (or of NumPy unsigned integers), `mask` has a 1 bit for
+    every model, and the result holds the sentence's value per model.
+
+    Both are generated as straight-line code with one assignment per
+    subsentence object, so no tree is walked and no dict consulted
+    while evaluating, and shared subsentences are evaluated only once.
+    """
+
+    def __init__(self, sentence, symbols=None):
+        if symbols is None:
+            symbols = sorted(sentence.symbols())
+        self.sentence = sentence
+        self.symbols = list(symbols)
+        index = {name: i for i, name in enumerate(self.symbols)}
+        self.evaluate = _build(sentence, index, _BOOLEAN, "values")
+        self.evaluate_bits = _build(sentence, index, _BITWISE,
+                                    "columns, mask")
+
+
+# Code templates per connective; And and Or give (joiner, empty value)
+_BOOLEAN = {
+    "symbol": "values[{}]",
+    "not": "not {}",
+    "and": (" and ", "True"),
+    "or": (" or ", "False"),
+    "implies": "(not {}) or {}",
+    "iff": "{} == {}",
+}
+_BITWISE = {
+    "symbol": "columns[{}]",
+    "not": "mask ^ {}",
+    "and": (" & ", "mask"),
+    "or": (" | ", "0"),
+    "implies": "(mask ^ {}) | {}",
+    "iff": "mask ^ ({} ^ {})",
+}
+
+
+def _children(sentence):
+    if isinstance(sentence, Not):
+        return [sentence.operand]
+    if isinstance(sentence, And):
+        return sentence.conjuncts
+    if isinstance(sentence, Or):
+        return sentence.disjuncts
+    if isinstance(sentence, Implication):
+        return [sentence.antecedent, sentence.consequent]
+    if isinstance(sentence, Biconditional):
+        return [sentence.left, sentence.right]
+    if isinstance(sentence, Symbol):
+        return []
+    raise TypeError(f"cannot compile {type(sentence).__name__}")
+
+
+def _build(sentence, index, templates, parameters):
+    """
+    Generates and compiles a function computing `sentence` with the
+    given code templates. The sentence is walked with an explicit stack,
+    so deeply nested sentences do not hit the recursion limit, and
+    subsentences are told apart by identity rather than by the
+    recursive `__eq__` and `__hash__`.
+    """
+    names = {}
+    lines = []
+    stack = [(sentence, False)]
+    while stack:
+        node, ready = stack.pop()
+        if id(node) in names:
+            continue
+        children = _children(node)
+        if not ready:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(children))
+            continue
+
+        operands = [names[id(child)] for child in children]
+        if isinstance(node, Symbol):
+            if node.name not in index:
+                raise ValueError(f"variable {node.name} not in symbols")
+            code = templates["symbol"].format(index[node.name])
+        elif isinstance(node, Not):
+            code = templates["not"].format(*operands)
+        elif isinstance(node, (And, Or)):
+            joiner, empty = templates["and" if isinstance(node, And)
+                                      else "or"]
+            code = joiner.join(operands) if operands else empty
+        elif isinstance(node, Implication):
+            code = templates["implies"].format(*operands)
+        else:
+            code = templates["iff"].format(*operands)
+
+        names[id(node)] = f"t{len(lines)}"
+        lines.append(f"    t{len(lines)} = {code}")
+
+    source = (f"def evaluate({parameters}):\n" + "\n".join(lines)
+              + f"\n    return {names[id(sentence)]}\n")
+    namespace = {}
+    exec(compile(source, "<compiled sentence>", "exec"), namespace)
+    return namespace["evaluate"]
+
+
+def lane_columns(count):
+    """
+    Returns `count` integers such that, across 2 ** count bit lanes,
+    lane j of column i holds bit i of j: every assignment of `count`
+    symbols appears in exactly one lane.
+    """
+    width = 1 << count
+    columns = []
+    for i in range(count):
+        run = (1 << (1 << i)) - 1
+        pattern = 0
+        for start in range(1 << i, width, 2 << i):
+            pattern |= run << start
+        columns.append(pattern)
+    return columns
+
+
+def model_check_compiled(knowledge, query):
+    """
+    Checks if knowledge base entails query by evaluating compiled
+    sentences on every model in turn.
+    """
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+    knowledge = CompiledSentence(knowledge, symbols).evaluate
+    query = CompiledSentence(query, symbols).evaluate
+    for values in itertools.product((True, False), repeat=len(symbols)):
+        if knowledge(values) and not query(values):
+            return False
+    return True
+
+
+def model_check_bitwise(knowledge, query, block_bits=BLOCK_BITS):
+    """
+    Checks if knowledge base entails query, evaluating 2 ** block_bits
+    models at a time as the bits of Python integers.
+
+    The first `block_bits` symbols vary across the bit lanes; each block
+    fixes the remaining symbols to one assignment.
+    """
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+    knowledge = CompiledSentence(knowledge, symbols).evaluate_bits
+    query = CompiledSentence(query, symbols).evaluate_bits
+
+    lanes = min(block_bits, len(symbols))
+    mask = (1 << (1 << lanes)) - 1
+    columns = lane_columns(lanes) + [0] * (len(symbols) - lanes)
+    for block in range(1 << (len(symbols) - lanes)):
+        for i in range(lanes, len(symbols)):
+            columns[i] = mask if block >> (i - lanes) & 1 else 0
+
+        # A model where the knowledge holds but the query does not
+        if knowledge(columns, mask) & (mask ^ query(columns, mask)):
+            return False
+    return True
+
+
+def model_check_numpy(knowledge, query, chunk_bits=CHUNK_BITS):
+    """
+    Checks if knowledge base entails query by building the truth table
+    as packed NumPy arrays, 64 models per uint64 word, and evaluating
+    both sentences over 2 ** chunk_bits models at a time with vectorized
+    bitwise operations. Memory is bounded by the chunk, not the table.
+
+    Requires NumPy.
+    """
+    import numpy as np
+
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+    if len(symbols) <= WORD_BITS:
+        return model_check_bitwise(knowledge, query, WORD_BITS)
+    knowledge = CompiledSentence(knowledge, symbols).evaluate_bits
+    query = CompiledSentence(query, symbols).evaluate_bits
+
+    mask = np.uint64((1 << (1 << WORD_BITS)) - 1)
+    zero = np.uint64(0)
+    chunk_bits = max(WORD_BITS, min(chunk_bits, len(symbols)))
+    words = 1 << (chunk_bits - WORD_BITS)
+
+    # Symbols varying within a word, then across the words of a chunk
+    columns = [np.full(words, pattern, dtype=np.uint64)
+               for pattern in lane_columns(WORD_BITS)]
+    word_index = np.arange(words, dtype=np.uint64)
+    for bit in range(chunk_bits - WORD_BITS):
+        varies = (word_index >> np.uint64(bit)) & np.uint64(1)
+        columns.append(np.where(varies == 1, mask, zero))
+
+    # The remaining symbols are fixed for a whole chunk
+    fixed = len(symbols) - chunk_bits
+    columns.extend([zero] * fixed)
+    for chunk in range(1 << fixed):
+        for bit in range(fixed):
+            columns[chunk_bits + bit] = mask if chunk >> bit & 1 else zero
+        if np.any(knowledge(columns, mask) & (mask ^ query(columns, mask))):
+            return False
+    return True
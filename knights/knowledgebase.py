@@ -0,0 +1,93 @@
+from sat import Encoder, Solver
+
+
+class KnowledgeBase():
+    """
+    A knowledge base that grows by `tell` and answers `ask` incrementally.
+
+    Sentences are encoded into one SAT solver as they are told, so the
+    solver's learned clauses carry over from one question to the next.
+    On top of that, answers and models are cached:
+
+    - an entailed query stays entailed however much more is told, so
+      its answer is kept for good;
+    - every model found while refuting a query is kept, and any later
+      query false in one of them is refuted without solving. Models are
+      dropped when a told sentence rules them out.
+    """
+
+    def __init__(self, *sentences):
+        self.encoder = Encoder()
+        self.solver = Solver()
+        self.sentences = []
+
+        # Clauses of the encoder already handed to the solver
+        self.flushed = 0
+
+        # Queries known to be entailed, and models of the knowledge so far
+        self.entailed = set()
+        self.models = []
+
+        # How many asks were answered from the caches, and by solving
+        self.hits = 0
+        self.solves = 0
+
+        for sentence in sentences:
+            self.tell(sentence)
+
+    def tell(self, sentence):
+        """Adds a sentence to the knowledge base."""
+        self.sentences.append(sentence)
+        self.encoder.add(sentence)
+        self._flush()
+        self.models = [model for model in self.models
+                       if _holds(sentence, model)]
+
+    def ask(self, query):
+        """Checks if the knowledge base entails query."""
+        if query in self.entailed:
+            self.hits += 1
+            return True
+        for model in self.models:
+            if _holds(query, model) is False:
+                self.hits += 1
+                return False
+
+        # Entailed exactly when no model of the knowledge falsifies query
+        literal = self.encoder.literal(query)
+        self._flush()
+        self.solves += 1
+        if self.solver.solve([-literal]):
+            self.models.append(self._model())
+            return False
+        self.entailed.add(query)
+        return True
+
+    def satisfiable(self):
+        """Checks if the knowledge base has any model at all."""
+        if self.models:
+            return True
+        if self.solver.solve():
+            self.models.append(self._model())
+            return True
+        return False
+
+    def _flush(self):
+        """Hands clauses added to the encoder since last time to the solver."""
+        for clause in self.encoder.clauses[self.flushed:]:
+            self.solver.add_clause(clause)
+        self.flushed = len(self.encoder.clauses)
+
+    def _model(self):
+        """Returns the solver's model as a dict of symbol names to values."""
+        model = self.solver.model
+        return {name: model.get(variable, False)
+                for name, variable in self.encoder.variables.items()}
+
+
+def _holds(sentence, model):
+    """Evaluates a sentence in a model, or returns None if the model
+    lacks one of its symbols."""
+    if not sentence.symbols() <= model.keys():
+        return None
+    return sentence.evaluate(model)
@@ -1,8 +1,19 @@
 import itertools
+import weakref
 
 
 class Sentence():
 
+    # Hash-consed sentences (see `hashcons`) cache their hash and the
+    # frozenset of their symbols here; for other sentences both are None
+    __slots__ = ("_hash", "_symbols", "__weakref__")
+
+    def __setattr__(self, name, value):
+        # Hash-consed sentences are shared, so they must never change
+        if getattr(self, "_hash", None) is not None:
+            raise TypeError("hash-consed sentences cannot be changed")
+        object.__setattr__(self, name, value)
+
     def evaluate(self, model):
         """Evaluates the logical sentence."""
         raise Exception("nothing to evaluate")
@@ -23,34 +34,37 @@ class Sentence():
     @classmethod
     def parenthesize(cls, s):
         """Parenthesizes an expression if not already parenthesized."""
-        def balanced(s):
-            """Checks if a string has balanced parentheses."""
-            count = 0
-            for c in s:
-                if c == "(":
-                    count += 1
-                elif c == ")":
-                    if count <= 0:
-                        return False
-                    count -= 1
-            return count == 0
-        if not len(s) or s.isalpha() or (
-            s[0] == "(" and s[-1] == ")" and balanced(s[1:-1])
-        ):
+        if not len(s) or s.isalpha():
             return s
-        else:
-            return f"({s})"
+
+        # Already parenthesized if the opening parenthesis closes last
+        count = 0
+        for i, c in enumerate(s):
+            if c == "(":
+                count += 1
+            elif c == ")":
+                count -= 1
+            if count == 0:
+                if i == len(s) - 1 and s[0] == "(":
+                    return s
+                break
+        return f"({s})"
 
 
 class Symbol(Sentence):
+    __slots__ = ("name",)
 
     def __init__(self, name):
         self.name = name
+        self._hash = None
+        self._symbols = None
 
     def __eq__(self, other):
         return isinstance(other, Symbol) and self.name == other.name
 
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash(("symbol", self.name))
 
     def __repr__(self):
@@ -70,14 +84,21 @@ class Symbol(Sentence):
 
 
 class Not(Sentence):
+    __slots__ = ("operand",)
+
     def __init__(self, operand):
         Sentence.validate(operand)
         self.operand = operand
+        self._hash = None
+        self._symbols = None
 
     def __eq__(self, other):
-        return isinstance(other, Not) and self.operand == other.operand
+        return self is other or (
+            isinstance(other, Not) and self.operand == other.operand)
 
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash(("not", hash(self.operand)))
 
     def __repr__(self):
@@ -87,22 +108,32 @@ class Not(Sentence):
         return not self.operand.evaluate(model)
 
     def formula(self):
-        return "¬" + Sentence.parenthesize(self.operand.formula())
+        return _formula(self)
 
     def symbols(self):
+        if self._symbols is not None:
+            return set(self._symbols)
         return self.operand.symbols()
 
 
 class And(Sentence):
+    __slots__ = ("conjuncts",)
+
     def __init__(self, *conjuncts):
         for conjunct in conjuncts:
             Sentence.validate(conjunct)
         self.conjuncts = list(conjuncts)
+        self._hash = None
+        self._symbols = None
 
     def __eq__(self, other):
-        return isinstance(other, And) and self.conjuncts == other.conjuncts
+        return self is other or (
+            isinstance(other, And)
+            and _same_parts(self.conjuncts, other.conjuncts))
 
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash(
             ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
         )
@@ -115,31 +146,40 @@ class And(Sentence):
 
     def add(self, conjunct):
         Sentence.validate(conjunct)
+        if self._hash is not None:
+            raise TypeError("hash-consed sentences cannot be changed")
         self.conjuncts.append(conjunct)
 
     def evaluate(self, model):
         return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
 
     def formula(self):
-        if len(self.conjuncts) == 1:
-            return self.conjuncts[0].formula()
-        return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
-                           for conjunct in self.conjuncts])
+        return _formula(self)
 
     def symbols(self):
+        if self._symbols is not None:
+            return set(self._symbols)
         return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
 
 
 class Or(Sentence):
+    __slots__ = ("disjuncts",)
+
     def __init__(self, *disjuncts):
         for disjunct in disjuncts:
             Sentence.validate(disjunct)
         self.disjuncts = list(disjuncts)
+        self._hash = None
+        self._symbols = None
 
     def __eq__(self, other):
-        return isinstance(other, Or) and self.disjuncts == other.disjuncts
+        return self is other or (
+            isinstance(other, Or)
+            and _same_parts(self.disjuncts, other.disjuncts))
 
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash(
             ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
         )
@@ -152,28 +192,34 @@ class Or(Sentence):
         return any(disjunct.evaluate(model) for disjunct in self.disjuncts)
 
     def formula(self):
-        if len(self.disjuncts) == 1:
-            return self.disjuncts[0].formula()
-        return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
-                            for disjunct in self.disjuncts])
+        return _formula(self)
 
     def symbols(self):
+        if self._symbols is not None:
+            return set(self._symbols)
         return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
 
 
 class Implication(Sentence):
+    __slots__ = ("antecedent", "consequent")
+
     def __init__(self, antecedent, consequent):
         Sentence.validate(antecedent)
         Sentence.validate(consequent)
         self.antecedent = antecedent
         self.consequent = consequent
+        self._hash = None
+        self._symbols = None
 
     def __eq__(self, other):
-        return (isinstance(other, Implication)
-                and self.antecedent == other.antecedent
-                and self.consequent == other.consequent)
+        return self is other or (
+            isinstance(other, Implication)
+            and self.antecedent == other.antecedent
+            and self.consequent == other.consequent)
 
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash(("implies", hash(self.antecedent), hash(self.consequent)))
 
     def __repr__(self):
@@ -184,27 +230,34 @@ class Implication(Sentence):
                 or self.consequent.evaluate(model))
 
     def formula(self):
-        antecedent = Sentence.parenthesize(self.antecedent.formula())
-        consequent = Sentence.parenthesize(self.consequent.formula())
-        return f"{antecedent} => {consequent}"
+        return _formula(self)
 
     def symbols(self):
+        if self._symbols is not None:
+            return set(self._symbols)
         return set.union(self.antecedent.symbols(), self.consequent.symbols())
 
 
 class Biconditional(Sentence):
+    __slots__ = ("left", "right")
+
     def __init__(self, left, right):
         Sentence.validate(left)
         Sentence.validate(right)
         self.left = left
         self.right = right
+        self._hash = None
+        self._symbols = None
 
     def __eq__(self, other):
-        return (isinstance(other, Biconditional)
-                and self.left == other.left
-                and self.right == other.right)
+        return self is other or (
+            isinstance(other, Biconditional)
+            and self.left == other.left
+            and self.right == other.right)
 
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash(("biconditional", hash(self.left), hash(self.right)))
 
     def __repr__(self):
@@ -217,16 +270,216 @@ class Biconditional(Sentence):
                     and not self.right.evaluate(model)))
 
     def formula(self):
-        left = Sentence.parenthesize(str(self.left))
-        right = Sentence.parenthesize(str(self.right))
-        return f"{left} <=> {right}"
+        return _formula(self)
 
     def symbols(self):
+        if self._symbols is not None:
+            return set(self._symbols)
         return set.union(self.left.symbols(), self.right.symbols())
 
 
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
+def _bare(sentence):
+    """Returns whether a sentence prints without parentheses as a part.
+
+    Symbols and negations stand alone; any other compound part is
+    parenthesized whichever connectives are involved, so
+    `Or(And(a, b), c)` prints as `(a ∧ b) ∨ c`.
+    """
+
+    # A single conjunct or disjunct prints as the part itself
+    while isinstance(sentence, (And, Or)) and len(_parts(sentence)) == 1:
+        sentence = _parts(sentence)[0]
+
+    if isinstance(sentence, Symbol):
+        name = sentence.name
+        return not name or name.isalpha()
+    if isinstance(sentence, Not):
+        return True
+    if isinstance(sentence, (And, Or)):
+        return not _parts(sentence)
+    return False
+
+
+def _formula(sentence):
+    """Returns the formula of a sentence.
+
+    Pieces are emitted left to right from an explicit stack, and whether
+    to parenthesize a part is decided from its type, so the cost
+    is linear in the size of the formula and deep sentences do not hit
+    the recursion limit.
+    """
+    pieces = []
+    stack = [sentence]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            pieces.append(item)
+            continue
+
+        if isinstance(item, Symbol):
+            pieces.append(item.name)
+            continue
+        if isinstance(item, Not):
+            pieces.append("¬")
+            parts, separator = [item.operand], ""
+        elif isinstance(item, (And, Or)):
+            parts = _parts(item)
+            if len(parts) == 1:
+                stack.append(parts[0])
+                continue
+            if isinstance(item, And):
+                separator = " ∧ "
+            else:
+                separator = " ∨ "
+        elif isinstance(item, Implication):
+            parts = [item.antecedent, item.consequent]
+            separator = " => "
+        elif isinstance(item, Biconditional):
+            parts = [item.left, item.right]
+            separator = " <=> "
+        else:
+            pieces.append(item.formula())
+            continue
+
+        # Push the parts in reverse so they come off the stack in order
+        for i, part in reversed(list(enumerate(parts))):
+            wrap = not _bare(part)
+            if wrap:
+                stack.append(")")
+            stack.append(part)
+            if wrap:
+                stack.append("(")
+            if i > 0:
+                stack.append(separator)
+    return "".join(pieces)
+
+
+# Hash-consed sentences, keyed by connective and the ids of their
+# (themselves hash-consed) parts; entries vanish once unused
+_hashconsed = weakref.WeakValueDictionary()
+
+
+def hashcons(sentence):
+    """Returns the shared, immutable copy of a sentence.
+
+    Structurally equal sentences and subsentences all map to one node,
+    which caches its hash and symbols, so hashing, comparing and asking
+    for symbols no longer walk the tree. Such a node holds its parts in
+    tuples, and `And.add` or setting any of its attributes raises
+    TypeError, since changing it would invalidate every cache above it.
+    """
+    shared = {}
+    stack = [(sentence, False)]
+    while stack:
+        node, ready = stack.pop()
+        if id(node) in shared:
+            continue
+        parts = _parts(node)
+        if not ready:
+            stack.append((node, True))
+            stack.extend((part, False) for part in parts)
+            continue
+
+        parts = [shared[id(part)] for part in parts]
+        if isinstance(node, Symbol):
+            key = ("symbol", node.name)
+        else:
+            key = (type(node), tuple(id(part) for part in parts))
+        result = _hashconsed.get(key)
+        if result is None:
+            result = _build_hashconsed(node, parts)
+            _hashconsed[key] = result
+        shared[id(node)] = result
+    return shared[id(sentence)]
+
+
+def _parts(sentence):
+    """Returns the immediate subsentences of a sentence."""
+    if isinstance(sentence, Symbol):
+        return []
+    if isinstance(sentence, Not):
+        return [sentence.operand]
+    if isinstance(sentence, And):
+        return sentence.conjuncts
+    if isinstance(sentence, Or):
+        return sentence.disjuncts
+    if isinstance(sentence, Implication):
+        return [sentence.antecedent, sentence.consequent]
+    if isinstance(sentence, Biconditional):
+        return [sentence.left, sentence.right]
+    raise TypeError(f"cannot hash-cons {type(sentence).__name__}")
+
+
+def _build_hashconsed(node, parts):
+    """Builds a hash-consed copy of `node` over hash-consed `parts`,
+    filling in the caches with the values the uncached methods give.
+
+    The copy holds its parts in tuples, and setting `_hash` last makes
+    every attribute read-only from then on."""
+    hashes = tuple(part._hash for part in parts)
+    if isinstance(node, Symbol):
+        result = Symbol(node.name)
+        result._symbols = frozenset({node.name})
+        result._hash = hash(("symbol", node.name))
+        return result
+    if isinstance(node, Not):
+        result = Not(*parts)
+        key = ("not", hashes[0])
+    elif isinstance(node, And):
+        result = And(*parts)
+        result.conjuncts = tuple(parts)
+        key = ("and", hashes)
+    elif isinstance(node, Or):
+        result = Or(*parts)
+        result.disjuncts = tuple(parts)
+        key = ("or", hashes)
+    elif isinstance(node, Implication):
+        result = Implication(*parts)
+        key = ("implies", *hashes)
+    else:
+        result = Biconditional(*parts)
+        key = ("biconditional", *hashes)
+    result._symbols = frozenset().union(*[part._symbols for part in parts])
+    result._hash = hash(key)
+    return result
+
+
+def _same_parts(a, b):
+    """Compares two sequences of parts, whether lists or tuples."""
+    return len(a) == len(b) and all(x == y for x, y in zip(a, b))
+
+
+def model_check(knowledge, query, engine="enumerate", **options):
+    """Checks if knowledge base entails query.
+
+    `engine` selects how: "enumerate" checks every model in turn, "sat"
+    asks a SAT solver whether knowledge ∧ ¬query is unsatisfiable,
+    "compiled" checks every model with sentences compiled to flat code,
+    "bitwise" checks 64 models at a time with bitwise operations, and
+    "numpy" checks the whole truth table in vectorized chunks (this one
+    requires NumPy), "parallel" splits the models among processes, and
+    "simplify" prunes models by simplifying the sentences as symbols are
+    fixed. Any `options` are passed on to the engine.
+    """
+    if engine == "sat":
+        from sat import entails
+        return entails(knowledge, query, **options)
+    if engine == "compiled":
+        from compiled import model_check_compiled
+        return model_check_compiled(knowledge, query, **options)
+    if engine == "bitwise":
+        from compiled import model_check_bitwise
+        return model_check_bitwise(knowledge, query, **options)
+    if engine == "numpy":
+        from compiled import model_check_numpy
+        return model_check_numpy(knowledge, query, **options)
+    if engine == "simplify":
+        return model_check_simplified(knowledge, query, **options)
+    if engine == "parallel":
+        from parallel import model_check_parallel
+        return model_check_parallel(knowledge, query, **options)
+    if engine != "enumerate":
+        raise ValueError(f"unknown model checking engine: {engine}")
 
     def check_all(knowledge, query, symbols, model):
         """Checks if knowledge base entails query, given a particular model."""
@@ -261,3 +514,164 @@ def model_check(knowledge, query):
 
     # Check that knowledge entails query
     return check_all(knowledge, query, symbols, dict())
+
+
+def model_check_many(knowledge, queries):
+    """Checks which of several queries the knowledge base entails.
+
+    The models of the knowledge base are enumerated only once, and every
+    query still in doubt is tested against each of them, so a batch of
+    queries costs about as much as one. Returns a list of booleans, one
+    per query, in order.
+    """
+    queries = list(queries)
+    symbols = sorted(set.union(knowledge.symbols(),
+                               *[query.symbols() for query in queries]))
+
+    # Indices of queries not yet refuted by some model
+    pending = list(range(len(queries)))
+    entailed = [True] * len(queries)
+
+    for values in itertools.product((True, False), repeat=len(symbols)):
+        model = dict(zip(symbols, values))
+        if not knowledge.evaluate(model):
+            continue
+
+        # A model of the knowledge where a query is false refutes it
+        still_pending = []
+        for i in pending:
+            if queries[i].evaluate(model):
+                still_pending.append(i)
+            else:
+                entailed[i] = False
+        pending = still_pending
+        if not pending:
+            break
+
+    return entailed
+
+
+def simplify(sentence, model=None):
+    """Simplifies a sentence, given values for some of its symbols.
+
+    Symbols in `model` are replaced by their values and the constants
+    folded away; nested Ands and Ors are flattened; repeated parts are
+    dropped; and a conjunction holding both a sentence and its negation
+    becomes false (a disjunction, true). Returns True or False if the
+    sentence's value is settled, and otherwise an equivalent sentence
+    over the remaining symbols.
+    """
+    if model is None:
+        model = {}
+
+    if isinstance(sentence, bool):
+        return sentence
+    if isinstance(sentence, Symbol):
+        return bool(model[sentence.name]) if sentence.name in model \
+            else sentence
+
+    if isinstance(sentence, Not):
+        operand = simplify(sentence.operand, model)
+        return _negate(operand)
+
+    if isinstance(sentence, (And, Or)):
+        conjunction = isinstance(sentence, And)
+
+        # The constant that settles the whole sentence, and the one
+        # that can simply be dropped
+        absorbing = not conjunction
+        parts = []
+        present = set()
+        stack = list(reversed(_parts(sentence)))
+        while stack:
+            part = simplify(stack.pop(), model)
+            if part is absorbing:
+                return absorbing
+            if part is (not absorbing):
+                continue
+            if isinstance(part, And if conjunction else Or):
+                stack.extend(reversed(_parts(part)))
+                continue
+            if part in present:
+                continue
+            present.add(part)
+            parts.append(part)
+
+        for part in parts:
+            if isinstance(part, Not) and part.operand in present:
+                return absorbing
+        if not parts:
+            return not absorbing
+        if len(parts) == 1:
+            return parts[0]
+        return And(*parts) if conjunction else Or(*parts)
+
+    if isinstance(sentence, Implication):
+        antecedent = simplify(sentence.antecedent, model)
+        consequent = simplify(sentence.consequent, model)
+        if antecedent is False or consequent is True:
+            return True
+        if antecedent is True:
+            return consequent
+        if consequent is False:
+            return _negate(antecedent)
+        return Implication(antecedent, consequent)
+
+    if isinstance(sentence, Biconditional):
+        left = simplify(sentence.left, model)
+        right = simplify(sentence.right, model)
+        if isinstance(left, bool) and isinstance(right, bool):
+            return left == right
+        if isinstance(left, bool):
+            left, right = right, left
+        if right is True:
+            return left
+        if right is False:
+            return _negate(left)
+        if left == right:
+            return True
+        return Biconditional(left, right)
+
+    raise TypeError(f"cannot simplify {type(sentence).__name__}")
+
+
+def _negate(sentence):
+    """Negates a simplified sentence or constant."""
+    if isinstance(sentence, bool):
+        return not sentence
+    if isinstance(sentence, Not):
+        return sentence.operand
+    return Not(sentence)
+
+
+def model_check_simplified(knowledge, query):
+    """Checks if knowledge base entails query, simplifying both after
+    each symbol is fixed.
+
+    A branch ends as soon as the knowledge is settled false, or the
+    query settled true, without enumerating the rest of its symbols,
+    and symbols that have dropped out of both sentences are never
+    branched on.
+    """
+
+    def check_all(knowledge, query):
+        """Checks entailment between two simplified sentences."""
+        if knowledge is False or query is True:
+            return True
+        if knowledge is True and query is False:
+            return False
+
+        # Branch on a symbol still mentioned by either sentence
+        symbols = set()
+        for sentence in (knowledge, query):
+            if not isinstance(sentence, bool):
+                symbols |= sentence.symbols()
+        p = min(symbols)
+
+        return all(
+            check_all(simplify(knowledge, {p: value}),
+                      simplify(query, {p: value}))
+            for value in (True, False)
+        )
+
+    return check_all(simplify(knowledge), simplify(query))
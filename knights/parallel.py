@@ -0,0 +1,96 @@
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# A worker looks at the shared stop flag once per 2 ** STOP_CHECK_BITS models
+STOP_CHECK_BITS = 10
+
+# Set in every worker once any of them finds a counterexample
+_stop = None
+
+
+def model_check_parallel(knowledge, query, workers=None, split_bits=None):
+    """
+    Checks if knowledge base entails query across a pool of processes.
+
+    The model space is split by fixing the first `split_bits` symbols to
+    each of their 2 ** split_bits assignments, and each subspace is
+    enumerated by a worker. As soon as one worker finds a model where
+    the knowledge holds but the query does not, the others stop.
+
+    `workers` defaults to the number of CPUs; `split_bits` defaults to
+    enough subspaces to give each worker about four.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+    if split_bits is None:
+        split_bits = (4 * workers - 1).bit_length()
+    split_bits = min(split_bits, len(symbols))
+    fixed, rest = symbols[:split_bits], symbols[split_bits:]
+
+    context = multiprocessing.get_context()
+    stop = context.Event()
+    with ProcessPoolExecutor(workers, mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(stop,)) as pool:
+        pending = {
+            pool.submit(_check_subspace, knowledge, query,
+                        dict(zip(fixed, values)), rest)
+            for values in itertools.product((True, False),
+                                            repeat=len(fixed))
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if any(future.result() is False for future in done):
+                stop.set()
+                for future in pending:
+                    future.cancel()
+                return False
+    return True
+
+
+def _init_worker(stop):
+    global _stop
+    _stop = stop
+
+
+def _check_subspace(knowledge, query, model, symbols):
+    """
+    Checks every model extending `model` with values for `symbols`.
+
+    Returns False on finding a counterexample, True if there is none,
+    and None if stopped because another worker found one.
+    """
+    try:
+        entailed = _check_all(knowledge, query, symbols, model, 0)
+    except _Stopped:
+        return None
+    if not entailed:
+        _stop.set()
+    return entailed
+
+
+class _Stopped(Exception):
+    pass
+
+
+def _check_all(knowledge, query, symbols, model, index):
+    """
+    Like `logic.model_check`'s check_all, but assigns symbols in order
+    within one model dict instead of copying it, and gives up when
+    another worker has found a counterexample.
+    """
+    remaining = len(symbols) - index
+    if remaining == 0:
+        return not knowledge.evaluate(model) or query.evaluate(model)
+    if remaining == STOP_CHECK_BITS and _stop.is_set():
+        raise _Stopped()
+
+    symbol = symbols[index]
+    for value in (True, False):
+        model[symbol] = value
+        if not _check_all(knowledge, query, symbols, model, index + 1):
+            return False
+    return True
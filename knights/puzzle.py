@@ -1,4 +1,5 @@
 from logic import *
+from knowledgebase import KnowledgeBase
 
 AKnight = Symbol("A is a Knight")
 AKnave = Symbol("A is a Knave")
@@ -89,11 +90,17 @@ def main():
     ]
     for puzzle, knowledge in puzzles:
         print(puzzle)
+
+        # Share equal subsentences and cache hashes and symbols
+        knowledge = hashcons(knowledge)
         if len(knowledge.conjuncts) == 0:
             print("    Not yet implemented.")
         else:
+
+            # One solver answers every query, reusing what it learns
+            kb = KnowledgeBase(knowledge)
             for symbol in symbols:
-                if model_check(knowledge, symbol):
+                if kb.ask(symbol):
                     print(f"    {symbol}")
 
 
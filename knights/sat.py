@@ -0,0 +1,554 @@
+import io
+
+from logic import And, Biconditional, Implication, Not, Or, Symbol
+
+
+def to_cnf(sentence):
+    """
+    Returns a sentence equivalent to `sentence` in conjunctive normal
+    form: an And of Ors of symbols and negated symbols.
+
+    Implications and biconditionals are eliminated, negations pushed
+    inward and Or distributed over And. The result can be exponentially
+    larger than the input; `Encoder` avoids that for satisfiability.
+    """
+    clauses = []
+    for clause in _cnf(sentence, True):
+        if clause not in clauses:
+            clauses.append(clause)
+    return And(*[
+        Or(*[Symbol(name) if positive else Not(Symbol(name))
+             for name, positive in sorted(clause)])
+        for clause in clauses
+    ])
+
+
+def _cnf(sentence, positive):
+    """
+    Returns the clauses of `sentence` (or of its negation, if not
+    `positive`) as a list of frozensets of (name, positive) literals.
+    Tautological clauses are dropped.
+    """
+    if isinstance(sentence, Symbol):
+        return [frozenset({(sentence.name, positive)})]
+    if isinstance(sentence, Not):
+        return _cnf(sentence.operand, not positive)
+    if isinstance(sentence, And):
+        if positive:
+            return _conjoin(_cnf(c, True) for c in sentence.conjuncts)
+        return _disjoin(_cnf(c, False) for c in sentence.conjuncts)
+    if isinstance(sentence, Or):
+        if positive:
+            return _disjoin(_cnf(d, True) for d in sentence.disjuncts)
+        return _conjoin(_cnf(d, False) for d in sentence.disjuncts)
+    if isinstance(sentence, Implication):
+        antecedent, consequent = sentence.antecedent, sentence.consequent
+        if positive:
+            return _disjoin([_cnf(antecedent, False),
+                             _cnf(consequent, True)])
+        return _conjoin([_cnf(antecedent, True), _cnf(consequent, False)])
+    if isinstance(sentence, Biconditional):
+        left, right = sentence.left, sentence.right
+        if positive:
+            return _conjoin([
+                _disjoin([_cnf(left, False), _cnf(right, True)]),
+                _disjoin([_cnf(left, True), _cnf(right, False)])
+            ])
+        return _conjoin([
+            _disjoin([_cnf(left, True), _cnf(right, True)]),
+            _disjoin([_cnf(left, False), _cnf(right, False)])
+        ])
+    raise TypeError(f"cannot convert {type(sentence).__name__} to CNF")
+
+
+def _conjoin(parts):
+    """
+    Returns the clauses of the conjunction of several clause lists.
+    """
+    clauses = []
+    for part in parts:
+        clauses.extend(part)
+    return clauses
+
+
+def _disjoin(parts):
+    """
+    Returns the clauses of the disjunction of several clause lists,
+    distributing Or over And.
+    """
+    clauses = [frozenset()]
+    for part in parts:
+        clauses = [left | right for left in clauses for right in part
+                   if not _tautology(left | right)]
+    return clauses
+
+
+def _tautology(clause):
+    return any((name, not positive) in clause for name, positive in clause)
+
+
+class Encoder():
+    """
+    Translates sentences into clauses over integer literals.
+
+    Each symbol, and each compound subsentence, gets a positive integer
+    variable; a negative literal is the variable's negation. Compound
+    subsentences are named with fresh variables (the Tseitin encoding),
+    so the clauses grow linearly with the sentences rather than
+    exponentially as with `to_cnf`. The clauses are satisfiable exactly
+    when the sentences added are.
+    """
+
+    def __init__(self):
+        self.clauses = []
+
+        # Maps symbol names to variables, and variables back to names
+        self.variables = {}
+        self.names = {}
+
+        # Literals already naming compound subsentences
+        self.literals = {}
+        self.count = 0
+
+    def variable(self, name):
+        """
+        Returns the variable for a symbol name, creating it if needed.
+        """
+        if name not in self.variables:
+            self.count += 1
+            self.variables[name] = self.count
+            self.names[self.count] = name
+        return self.variables[name]
+
+    def add(self, sentence):
+        """
+        Adds clauses asserting that `sentence` is true.
+        """
+        if isinstance(sentence, And):
+            for conjunct in sentence.conjuncts:
+                self.add(conjunct)
+        elif isinstance(sentence, Or):
+            self.clauses.append([self.literal(disjunct)
+                                 for disjunct in sentence.disjuncts])
+        else:
+            self.clauses.append([self.literal(sentence)])
+
+    def literal(self, sentence):
+        """
+        Returns a literal that is true exactly when `sentence` is,
+        adding the clauses that define it.
+        """
+        if isinstance(sentence, Symbol):
+            return self.variable(sentence.name)
+        if isinstance(sentence, Not):
+            return -self.literal(sentence.operand)
+        if sentence in self.literals:
+            return self.literals[sentence]
+
+        if isinstance(sentence, And):
+            parts = [self.literal(c) for c in sentence.conjuncts]
+            if len(parts) == 1:
+                return parts[0]
+            x = self._fresh()
+            for part in parts:
+                self.clauses.append([-x, part])
+            self.clauses.append([x] + [-part for part in parts])
+        elif isinstance(sentence, Or):
+            parts = [self.literal(d) for d in sentence.disjuncts]
+            if len(parts) == 1:
+                return parts[0]
+            x = self._fresh()
+            for part in parts:
+                self.clauses.append([x, -part])
+            self.clauses.append([-x] + parts)
+        elif isinstance(sentence, Implication):
+            a = self.literal(sentence.antecedent)
+            b = self.literal(sentence.consequent)
+            x = self._fresh()
+            self.clauses.extend([[-x, -a, b], [x, a], [x, -b]])
+        elif isinstance(sentence, Biconditional):
+            a = self.literal(sentence.left)
+            b = self.literal(sentence.right)
+            x = self._fresh()
+            self.clauses.extend([[-x, -a, b], [-x, a, -b],
+                                 [x, a, b], [x, -a, -b]])
+        else:
+            raise TypeError(f"cannot encode {type(sentence).__name__}")
+
+        self.literals[sentence] = x
+        return x
+
+    def _fresh(self):
+        self.count += 1
+        return self.count
+
+
+class Solver():
+    """
+    Conflict-driven clause learning (CDCL) SAT solver.
+
+    This is DPLL search - decide a literal, propagate unit clauses,
+    backtrack on conflict - where each conflict is also analysed into a
+    learned clause that prevents the same conflict recurring and says
+    how far back to jump. Unit propagation uses two watched literals per
+    clause, so only clauses watching a literal that just became false
+    are visited.
+
+    Clauses may be added between calls to `solve`, and learned clauses
+    are kept, so related problems get faster as the solver is reused.
+    """
+
+    def __init__(self):
+        self.clauses = []
+        self.variables = set()
+
+        # Maps each literal to the indices of clauses watching it
+        self.watches = {}
+
+        # Current assignment: value, decision level and reason clause
+        # (None for decisions and top-level facts) per variable
+        self.values = {}
+        self.levels = {}
+        self.reasons = {}
+
+        # Assigned literals in order, and where each decision level starts
+        self.trail = []
+        self.trail_limits = []
+        self.propagated = 0
+
+        # Branching heuristics: conflict activity and last value per variable
+        self.activity = {}
+        self.phases = {}
+
+        # Set once the clauses are unsatisfiable on their own
+        self.inconsistent = False
+        self.model = None
+
+        # Search statistics
+        self.decisions = 0
+        self.propagations = 0
+        self.conflicts = 0
+        self.learned = 0
+
+    def add_clause(self, literals):
+        """
+        Adds a clause, given as an iterable of non-zero integer literals.
+
+        Returns False if the clauses are now known to be unsatisfiable.
+        """
+        self._backtrack(0)
+        if self.inconsistent:
+            return False
+
+        clause = []
+        for literal in literals:
+            if -literal in clause:
+                return True
+            if literal not in clause:
+                clause.append(literal)
+                self.variables.add(abs(literal))
+
+        # Top-level facts never change, so simplify the clause by them
+        if any(self._value(literal) is True for literal in clause):
+            return True
+        clause = [literal for literal in clause
+                  if self._value(literal) is None]
+
+        if not clause:
+            self.inconsistent = True
+            return False
+        if len(clause) == 1:
+            self._assign(clause[0], None)
+            if self._propagate() is not None:
+                self.inconsistent = True
+                return False
+            return True
+        self._attach(clause)
+        return True
+
+    def solve(self, assumptions=()):
+        """
+        Returns whether the clauses, together with the `assumptions`
+        literals, are satisfiable. If they are, `self.model` maps every
+        variable to a value satisfying them.
+        """
+        self._backtrack(0)
+        self.model = None
+        if self.inconsistent:
+            return False
+
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                if not self.trail_limits:
+                    self.inconsistent = True
+                    return False
+                learned, level = self._analyze(conflict)
+                self._backtrack(level)
+                self.learned += 1
+                if len(learned) == 1:
+                    self._assign(learned[0], None)
+                else:
+                    self._assign(learned[0], self._attach(learned))
+                continue
+
+            # Assumptions are the first decisions; one already false
+            # means the clauses contradict them
+            level = len(self.trail_limits)
+            if level < len(assumptions):
+                literal = assumptions[level]
+                value = self._value(literal)
+                if value is False:
+                    self._backtrack(0)
+                    return False
+                self.trail_limits.append(len(self.trail))
+                if value is None:
+                    self._assign(literal, None)
+                continue
+
+            literal = self._decide()
+            if literal is None:
+                self.model = dict(self.values)
+                self._backtrack(0)
+                return True
+            self.decisions += 1
+            self.trail_limits.append(len(self.trail))
+            self._assign(literal, None)
+
+    def _value(self, literal):
+        value = self.values.get(abs(literal))
+        if value is None:
+            return None
+        return value if literal > 0 else not value
+
+    def _assign(self, literal, reason):
+        variable = abs(literal)
+        self.values[variable] = literal > 0
+        self.levels[variable] = len(self.trail_limits)
+        self.reasons[variable] = reason
+        self.trail.append(literal)
+
+    def _attach(self, clause):
+        """
+        Stores a clause of two or more literals, watching its first two,
+        and returns its index.
+        """
+        index = len(self.clauses)
+        self.clauses.append(clause)
+        self.watches.setdefault(clause[0], []).append(index)
+        self.watches.setdefault(clause[1], []).append(index)
+        return index
+
+    def _propagate(self):
+        """
+        Assigns every literal forced by unit clauses.
+
+        Returns the index of a clause made false, or None.
+        """
+        while self.propagated < len(self.trail):
+            false = -self.trail[self.propagated]
+            self.propagated += 1
+
+            watching = self.watches.get(false, [])
+            kept = []
+            conflict = None
+            for position, index in enumerate(watching):
+                clause = self.clauses[index]
+
+                # Keep the false literal in the second watch slot
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], clause[0]
+                if self._value(clause[0]) is True:
+                    kept.append(index)
+                    continue
+
+                # Move the watch to any literal that is not false
+                for k in range(2, len(clause)):
+                    if self._value(clause[k]) is not False:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        self.watches.setdefault(clause[1], []).append(index)
+                        break
+                else:
+                    kept.append(index)
+                    if self._value(clause[0]) is False:
+                        conflict = index
+                        kept.extend(watching[position + 1:])
+                        break
+                    self._assign(clause[0], index)
+                    self.propagations += 1
+
+            self.watches[false] = kept
+            if conflict is not None:
+                return conflict
+        return None
+
+    def _analyze(self, conflict):
+        """
+        Derives a learned clause from a conflict by resolving it with
+        reason clauses back to the first unique implication point.
+
+        Returns the learned clause, whose first literal becomes true once
+        the search backtracks to the returned level.
+        """
+        level = len(self.trail_limits)
+        learned = []
+        seen = set()
+        pending = 0
+        literal = None
+        clause = self.clauses[conflict]
+        position = len(self.trail) - 1
+
+        while True:
+            for other in clause:
+                variable = abs(other)
+                if other == literal or variable in seen:
+                    continue
+                if self.levels[variable] == 0:
+                    continue
+                seen.add(variable)
+                self.activity[variable] = self.activity.get(variable, 0) + 1
+                if self.levels[variable] == level:
+                    pending += 1
+                else:
+                    learned.append(other)
+
+            # Step back to the latest assignment involved in the conflict
+            while abs(self.trail[position]) not in seen:
+                position -= 1
+            literal = self.trail[position]
+            position -= 1
+            pending -= 1
+            if pending == 0:
+                break
+            clause = self.clauses[self.reasons[abs(literal)]]
+
+        learned.insert(0, -literal)
+        if len(learned) == 1:
+            return learned, 0
+
+        # Watch the literal assigned last among the rest, so the clause
+        # becomes unit exactly at the level jumped back to
+        deepest = max(range(1, len(learned)),
+                      key=lambda i: self.levels[abs(learned[i])])
+        learned[1], learned[deepest] = learned[deepest], learned[1]
+        return learned, self.levels[abs(learned[1])]
+
+    def _backtrack(self, level):
+        """
+        Undoes every assignment made above decision level `level`.
+        """
+        if len(self.trail_limits) <= level:
+            return
+        limit = self.trail_limits[level]
+        for literal in self.trail[limit:]:
+            variable = abs(literal)
+            self.phases[variable] = literal > 0
+            del self.values[variable]
+            del self.levels[variable]
+            del self.reasons[variable]
+        del self.trail[limit:]
+        del self.trail_limits[level:]
+        self.propagated = min(self.propagated, limit)
+
+    def _decide(self):
+        """
+        Returns the next decision literal: the unassigned variable most
+        involved in recent conflicts, with the value it last had.
+        """
+        best = None
+        for variable in self.variables:
+            if variable in self.values:
+                continue
+            if best is None or (self.activity.get(variable, 0)
+                                > self.activity.get(best, 0)):
+                best = variable
+        if best is None:
+            return None
+        return best if self.phases.get(best, False) else -best
+
+
+def eliminate_pure_literals(clauses):
+    """
+    Repeatedly sets literals whose negation appears in no clause, which
+    satisfies every clause containing them without affecting the rest.
+
+    Returns a tuple of (remaining clauses, pure literals set).
+    """
+    clauses = [list(clause) for clause in clauses]
+    pure = []
+    while True:
+        literals = {literal for clause in clauses for literal in clause}
+        found = {literal for literal in literals if -literal not in literals}
+        if not found:
+            return clauses, pure
+        pure.extend(found)
+        clauses = [clause for clause in clauses
+                   if not any(literal in found for literal in clause)]
+
+
+def solve(clauses):
+    """
+    Returns a satisfying assignment for a list of clauses, as a dict of
+    variable to value, or None if they are unsatisfiable.
+    """
+    clauses, pure = eliminate_pure_literals(clauses)
+    solver = Solver()
+    for clause in clauses:
+        if not solver.add_clause(clause):
+            return None
+    if not solver.solve():
+        return None
+    model = solver.model
+    for literal in pure:
+        model[abs(literal)] = literal > 0
+    return model
+
+
+def satisfiable(sentence):
+    """
+    Returns a model of `sentence`, as a dict of symbol names to values,
+    or None if it is unsatisfiable.
+    """
+    encoder = Encoder()
+    encoder.add(sentence)
+    model = solve(encoder.clauses)
+    if model is None:
+        return None
+    return {name: model.get(variable, False)
+            for name, variable in encoder.variables.items()}
+
+
+def entails(knowledge, query):
+    """
+    Checks if knowledge base entails query, by checking that
+    knowledge ∧ ¬query is unsatisfiable.
+    """
+    encoder = Encoder()
+    encoder.add(knowledge)
+    encoder.add(Not(query))
+    return solve(encoder.clauses) is None
+
+
+def write_dimacs(sentence, file):
+    """
+    Writes the clauses of `sentence` to a text file in DIMACS CNF
+    format, as read by most SAT solvers. Each symbol's variable number
+    is given in a comment line before the header.
+    """
+    encoder = Encoder()
+    encoder.add(sentence)
+    for name, variable in encoder.variables.items():
+        file.write(f"c {variable} {name}\n")
+    file.write(f"p cnf {encoder.count} {len(encoder.clauses)}\n")
+    for clause in encoder.clauses:
+        file.write(" ".join(map(str, clause)) + " 0\n")
+
+
+def to_dimacs(sentence):
+    """
+    Returns the clauses of `sentence` in DIMACS CNF format as a string.
+    """
+    buffer = io.StringIO()
+    write_dimacs(sentence, buffer)
+    return buffer.getvalue()